@@ -0,0 +1,99 @@
+# Shared helpers for the benchmarks in this directory. They run on the
+# MicroPython unix port as well as on CPython:
+#
+#   cd bench && micropython deque_bench.py
+#   cd bench && python3 deque_bench.py
+
+import gc
+import sys
+import time
+
+try:
+    import ustruct
+except ImportError:
+    # CPython: map the MicroPython module names used in src/
+    import struct, json, binascii, socket
+    sys.modules.update(ustruct=struct, utime=time, ujson=json, ubinascii=binascii,
+                       usocket=socket)
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+
+LIB = '../src/lib'
+SRC = '../src'
+for p in (SRC, LIB):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+if not hasattr(sys, 'implementation') or sys.implementation.name != 'micropython':
+    # CPython's collections package shadows ours, register the deque
+    # module under its name so `from collections.deque import deque` works
+    import types
+    _deque = types.ModuleType('collections.deque')
+    exec(open(LIB + '/collections/deque.py').read(), _deque.__dict__)
+    sys.modules['collections.deque'] = _deque
+
+try:
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    def ticks_us():
+        return int(time.perf_counter() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+def allocs(fn, n):
+    # Bytes allocated by fn(n). MicroPython: heap growth with the collector
+    # disabled. CPython frees temporaries right away and has no cumulative
+    # counter, so there it is the tracemalloc peak of one fn(1) call times
+    # n: what one operation holds at once, a lower bound of what it
+    # allocates, and 0 for code that doesn't allocate. Reuse of CPython's
+    # free lists (small dicts, tuples, floats) isn't seen at all.
+    if not hasattr(gc, 'mem_alloc'):
+        import tracemalloc
+        fn(1)  # warm up caches, e.g. of struct formats
+        tracemalloc.start()
+        a0 = tracemalloc.get_traced_memory()[0]
+        fn(1)
+        a = tracemalloc.get_traced_memory()[1] - a0
+        tracemalloc.stop()
+        return a * n
+    gc.collect()
+    gc.disable()
+    a0 = gc.mem_alloc()
+    fn(n)
+    a = gc.mem_alloc() - a0
+    gc.enable()
+    return a
+
+
+def per_op(a, n):
+    # marks the CPython numbers, they are peaks, not allocations
+    return str(a // n) + ('' if hasattr(gc, 'mem_alloc') else ' peak')
+
+
+def load(path, name):
+    # Execute a module from src/lib by path. Needed on CPython where the
+    # standard library shadows names like collections.
+    ns = {'__name__': name}
+    exec(open(LIB + '/' + path).read(), ns)
+    return ns[name]
+
+
+def run(coro):
+    # Drive a coroutine that never really has to wait (e.g. a driver on
+    # FakeBus) to completion outside an event loop
+    try:
+        while True:
+            coro.send(None)
+    except StopIteration as e:
+        return e.value
+
+
+def bench(label, fn, n):
+    t0 = ticks_us()
+    fn(n)
+    dt = ticks_diff(ticks_us(), t0)
+    print('{:<40} {:>10} us {:>10.3f} us/op'.format(label, dt, dt / n))
+    return dt
@@ -0,0 +1,140 @@
+# CPython stand-in for the parts of the uasyncio fork in src/lib that
+# umqtt.aclient and outbox use, on top of asyncio, so the *_check.py
+# scripts also run without the unix port:
+#
+#   cd bench && python3 outbox_check.py
+#
+# Importing it registers uasyncio, uasyncio.core and uasyncio.synchro in
+# sys.modules. Does nothing on MicroPython, there the real fork runs.
+
+import sys
+
+if sys.implementation.name != 'micropython':
+    import asyncio
+    import types
+
+    _tasks = {}  # coroutine: asyncio task, for cancel()
+
+    class _Loop:
+
+        def __init__(self):
+            self._loop = asyncio.new_event_loop()
+
+        def create_task(self, coro):
+            task = self._loop.create_task(coro)
+            _tasks[coro] = task
+            task.add_done_callback(lambda t, c=coro: _tasks.pop(c, None))
+            return task
+
+        def run_until_complete(self, coro):
+            res = self._loop.run_until_complete(coro)
+            # stop what the clients left running, quietly
+            rest = [t for t in asyncio.all_tasks(self._loop) if not t.done()]
+            for t in rest:
+                t.cancel()
+            self._loop.run_until_complete(asyncio.gather(*rest, return_exceptions=True))
+            return res
+
+        def remove_reader(self, s):
+            pass
+
+        def remove_writer(self, s):
+            pass
+
+        @property
+        def cur_task(self):
+            task = asyncio.current_task(self._loop)
+            return task.get_coro() if task is not None else None
+
+    _loop = _Loop()
+
+    def get_event_loop():
+        return _loop
+
+    def cancel(coro):
+        task = _tasks.get(coro)
+        if task is not None:
+            task.cancel()
+
+    async def sleep_ms(ms):
+        await asyncio.sleep(ms / 1000)
+
+    async def wait_for_ms(coro, ms):
+        return await asyncio.wait_for(coro, ms / 1000)
+
+    class _Reader:
+
+        def __init__(self, reader):
+            self._reader = reader
+
+        async def readexactly(self, n):
+            # like the fork, short at EOF instead of raising
+            try:
+                return await self._reader.readexactly(n)
+            except asyncio.IncompleteReadError as e:
+                return e.partial
+            except ConnectionError:
+                return b''
+
+    class _Socket:
+
+        def __init__(self, writer):
+            self._writer = writer
+
+        def close(self):
+            self._writer.transport.abort()
+
+    class _Writer:
+
+        def __init__(self, writer):
+            self._writer = writer
+            self.s = _Socket(writer)
+
+        async def awrite(self, buf, off=0, sz=-1):
+            if self._writer.transport.is_closing():
+                raise OSError(-1)
+            self._writer.write(bytes(buf[off:] if sz < 0 else buf[off:off + sz]))
+            try:
+                await self._writer.drain()
+            except ConnectionError:
+                raise OSError(-1)
+
+    async def open_connection(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return _Reader(reader), _Writer(writer)
+
+    async def wait_on(waiters):
+        fut = asyncio.get_running_loop().create_future()
+        waiters.append(fut)
+        await fut
+
+    def wake(waiters):
+        while waiters:
+            fut = waiters.pop(0)
+            if not fut.done():
+                fut.set_result(None)
+                return True
+        return False
+
+    class Lock:
+
+        def __init__(self):
+            self._lock = asyncio.Lock()
+
+        async def acquire(self):
+            await self._lock.acquire()
+
+        def release(self):
+            self._lock.release()
+
+    _ua = types.ModuleType('uasyncio')
+    _ua.__path__ = []
+    for _name in ('get_event_loop', 'cancel', 'sleep_ms', 'wait_for_ms', 'open_connection'):
+        setattr(_ua, _name, globals()[_name])
+    _ua.CancelledError = asyncio.CancelledError
+    _core = types.ModuleType('uasyncio.core')
+    _core.wait_on = wait_on
+    _core.wake = wake
+    _synchro = types.ModuleType('uasyncio.synchro')
+    _synchro.Lock = Lock
+    sys.modules.update({'uasyncio': _ua, 'uasyncio.core': _core, 'uasyncio.synchro': _synchro})
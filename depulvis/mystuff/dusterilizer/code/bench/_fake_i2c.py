@@ -0,0 +1,81 @@
+# An in-memory I2C bus answering the Sensirion commands used by the drivers
+# with valid, CRC protected frames.
+
+import ustruct as struct
+
+
+def crc8(data):
+    crc = 0xFF
+    for b in data:
+        crc ^= b
+        for bit in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def frame(raw):
+    # Split raw bytes into 16 bit words, each followed by its CRC
+    out = bytearray()
+    for i in range(0, len(raw), 2):
+        out += raw[i:i+2]
+        out.append(crc8(raw[i:i+2]))
+    return bytes(out)
+
+
+SPS30_VALUES = (1.5, 2.5, 3.5, 4.5, 10.0, 11.0, 12.0, 13.0, 14.0, 0.6)
+
+
+class FakeI2C:
+
+    def __init__(self):
+        self.writes = 0
+        self.reads = 0
+        self._cmd = {}
+        self.responses = {
+            (0x69, b'\x03\x00'): frame(struct.pack('>10f', *SPS30_VALUES)),
+            (0x69, b'\x02\x02'): frame(b'\x00\x01'),
+            (0x69, b'\x80\x04'): frame(b'\x00\x00\x00\x00'),
+            (0x44, b'\x24\x00'): frame(b'\x66\x66\x60\x00'),
+            (0x44, b'\x24\x0b'): frame(b'\x66\x66\x60\x00'),
+            (0x44, b'\x24\x16'): frame(b'\x66\x66\x60\x00'),
+            (0x44, b'\xe0\x00'): frame(b'\x66\x66\x60\x00'),
+            (0x44, b'\xf3\x2d'): frame(b'\x80\x10'),
+            (0x58, b'\x20\x08'): frame(b'\x01\x90\x00\x00'),
+            (0x58, b'\x20\x15'): frame(b'\x8a\x3b\x8c\x21'),
+        }
+
+    def scan(self):
+        return [0x44, 0x58, 0x69]
+
+    def writeto(self, addr, buf):
+        self.writes += 1
+        self._cmd[addr] = bytes(buf[:2])
+        return 1
+
+    def readfrom(self, addr, n):
+        self.reads += 1
+        return self.responses[(addr, self._cmd[addr])][:n]
+
+    def readfrom_into(self, addr, buf):
+        self.reads += 1
+        r = self.responses[(addr, self._cmd[addr])]
+        n = min(len(buf), len(r))
+        buf[:n] = r[:n]
+
+
+class FakeBus:
+    # Same interface as i2cbus.I2CBus without uasyncio: delays are skipped
+
+    def __init__(self, i2c=None):
+        self.i2c = i2c if i2c is not None else FakeI2C()
+
+    async def write(self, addr, data, delay_ms=0):
+        self.i2c.writeto(addr, data)
+
+    async def read(self, addr, cmd, n, delay_ms=0):
+        self.i2c.writeto(addr, cmd)
+        return self.i2c.readfrom(addr, n)
+
+    async def read_into(self, addr, cmd, buf, delay_ms=0):
+        self.i2c.writeto(addr, cmd)
+        self.i2c.readfrom_into(addr, buf)
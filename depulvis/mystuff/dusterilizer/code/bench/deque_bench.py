@@ -0,0 +1,40 @@
+# Compare the ring buffer deque with the former list backed one at
+# different backlog sizes. Every step is one append + one popleft on a
+# deque already holding `backlog` items (a queue in steady state).
+
+from _bench import bench, load
+
+try:
+    from collections.deque import deque
+except ImportError:
+    deque = load('collections/deque.py', 'deque')
+
+
+class list_deque:
+
+    def __init__(self, iterable=None):
+        self.q = [] if iterable is None else list(iterable)
+
+    def popleft(self):
+        return self.q.pop(0)
+
+    def append(self, a):
+        self.q.append(a)
+
+
+def run(cls, backlog):
+    d = cls(range(backlog))
+
+    def steps(n):
+        for i in range(n):
+            d.append(i)
+            d.popleft()
+    return steps
+
+
+for backlog in (10, 1000, 100000):
+    ops = 10000 if backlog < 100000 else 1000
+    print('backlog', backlog)
+    a = bench('  list deque', run(list_deque, backlog), ops)
+    b = bench('  ring deque', run(deque, backlog), ops)
+    print('  speedup {:.1f}x'.format(a / b))
@@ -0,0 +1,61 @@
+# Decoding of the 60 byte SPS30 measurement frame: the former per float
+# path (bitwise CRC of every word, pack/unpack of every value) against the
+# shared sensirion code (table CRC over the whole frame, one unpack).
+
+from _bench import allocs, bench, per_op
+import ustruct as struct
+from _fake_i2c import frame, SPS30_VALUES
+from sensirion import check_frame, payload
+
+N = 500
+
+FRAME = frame(struct.pack('>10f', *SPS30_VALUES))
+
+
+# what SPS30._calc_crc and SPS30._calc_float used to do
+def bitwise_crc(data):
+    crc = 0xFF
+    for i in range(2):
+        crc = (crc ^ data[i]) & 0xFF
+        for bit in range(8, 0, -1):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = ((crc << 1)) & 0xFF
+    return bytes([crc])
+
+
+def calc_float(b):
+    struct_float = struct.pack('>BBBB', b[0], b[1], b[3], b[4])
+    float_values = struct.unpack('>f', struct_float)
+    crc1 = bitwise_crc(b[0:2])
+    crc2 = bitwise_crc(b[3:5])
+    if crc1 == bytes([b[2]]) and crc2 == bytes([b[5]]):
+        return float_values[0]
+    return None
+
+
+def per_float(n):
+    for _ in range(n):
+        values = [calc_float(FRAME[6*i:6*i+6]) for i in range(10)]
+    return values
+
+
+def whole_frame(n):
+    for _ in range(n):
+        if check_frame(FRAME):
+            values = struct.unpack('>10f', payload(FRAME))
+    return values
+
+
+def check_only(n):
+    for _ in range(n):
+        check_frame(FRAME)
+
+
+assert per_float(1) == list(whole_frame(1))
+for label, fn in (('bitwise crc, float by float', per_float),
+                  ('table crc, one unpack', whole_frame),
+                  ('  of which crc check', check_only)):
+    bench(label, fn, N)
+    print('{:<40} {:>10} bytes/frame'.format('', per_op(allocs(fn, N), N)))
@@ -0,0 +1,52 @@
+# Exercise umqtt.aclient against mqtt_broker.py on the MicroPython unix port
+# or on CPython with _cpython_uasyncio.py:
+#
+#   python3 mqtt_broker.py --drop 3 &
+#   micropython mqtt_aclient_check.py    (or python3 mqtt_aclient_check.py)
+#
+# Publishes while a subscription echoes messages back, keeps sending ticks
+# from a second task to show the loop never stalls, and survives the
+# broker dropping the connection.
+
+from _bench import ticks_us, ticks_diff
+import _cpython_uasyncio
+import uasyncio as asyncio
+from umqtt.aclient import MQTTClient
+
+received = []
+
+
+async def ticker(res):
+    # Largest gap between 10 ms ticks, i.e. the longest loop stall
+    t = ticks_us()
+    while True:
+        await asyncio.sleep_ms(10)
+        now = ticks_us()
+        res[0] = max(res[0], ticks_diff(now, t))
+        t = now
+
+
+async def main():
+    stall = [0]
+    asyncio.get_event_loop().create_task(ticker(stall))
+    sub = MQTTClient(b'check_sub', '127.0.0.1', keepalive=2)
+    sub.set_callback(lambda t, m: received.append(m))
+    await sub.connect()
+    await sub.subscribe(b'check')
+    pub = MQTTClient(b'check_pub', '127.0.0.1', keepalive=2, reconnect_ms=200)
+    await pub.connect()
+    sent = 0
+    for i in range(60):
+        try:
+            await pub.publish(b'check', str(i))
+            sent += 1
+        except OSError:
+            pass
+        await asyncio.sleep_ms(100)
+    await asyncio.sleep_ms(500)
+    print('sent', sent, 'received', len(received), 'max loop stall', stall[0], 'us')
+    await pub.disconnect()
+    await sub.disconnect()
+
+
+asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,139 @@
+# Batch publish against mqtt_broker.py: N frames as single messages and as
+# telemetry.Batch payloads of several sizes, plain and deflated, for the
+# binary and the JSON format. Prints the time per reading, the messages
+# and MQTT bytes that reach the broker, the latter also with the 40 bytes
+# of IPv4 and TCP header a message costs at least on the wire, and unpacks
+# everything with host/telemetry.py.
+# CPython only (the broker stand-in and the host decoder are):
+#
+#   cd bench && python3 mqtt_batch_bench.py
+
+from _bench import bench
+import asyncio
+import random
+import socket
+import sys
+import threading
+import ujson
+sys.modules['usocket'] = socket
+from umqtt.simple import MQTTClient
+from record import Record
+from telemetry import Batch, Encoder
+from mqtt_broker import serve
+
+N = 2000
+TCPIP = 40
+
+
+class Frame(Record):
+    # same table as tasks.acquisition_task.Frame, without the drivers
+    FIELDS = ('pm1_mass', 'pm25_mass', 'pm4_mass', 'pm10_mass',
+              'pm05_num', 'pm1_num', 'pm25_num', 'pm4_num', 'pm10_num',
+              'typical_size', 'humidity', 'temperature', 'eco2', 'tvoc')
+
+
+class SockIO:
+    # the read/write socket API umqtt.simple expects from MicroPython
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, buf, n=None):
+        self.sock.sendall(memoryview(buf)[:n] if n is not None else buf)
+
+    def read(self, n):
+        return self.sock.recv(n)
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def close(self):
+        self.sock.close()
+
+
+# a slowly drifting air quality record, like consecutive frames
+random.seed(1)
+frames = []
+rec = Frame()
+for i in range(N):
+    for j in range(len(Frame.FIELDS)):
+        rec[j] = max(0.0, rec[j] + random.uniform(-1, 1.2))
+    rec.timestamp = 719000000 + i
+    frames.append(rec.values[:])
+encoder = Encoder(Frame.FIELDS)
+
+received = []
+loop = asyncio.new_event_loop()
+broker, server = loop.run_until_complete(serve(0, (), lambda t, m, op: received.append(m)))
+port = server.sockets[0].getsockname()[1]
+threading.Thread(target=loop.run_forever, daemon=True).start()
+
+
+def connect():
+    client = MQTTClient(b'bench', '127.0.0.1', port, buf_size=1100)
+    sock = socket.create_connection(('127.0.0.1', port))
+    client.sock = SockIO(sock)
+    client.sock.write(b'\x10\x11\x00\x04MQTT\x04\x02\x00\x00\x00\x05bench')
+    assert client.sock.read(4) == b'\x20\x02\x00\x00'
+    return client
+
+
+def payload(fmt, seq):
+    rec.values[:] = frames[seq]
+    rec.timestamp = 719000000 + seq
+    if fmt == 'binary':
+        return encoder.frame(seq, rec)
+    d = rec.as_dict()
+    d['seq'] = seq
+    return ujson.dumps(d).encode()
+
+
+def run(fmt, size, compress):
+    client = connect()
+    batch = Batch(size, compress=compress) if size > 1 else None
+    sent = [0]
+
+    def put(p):
+        client.publish(b'pm', p)
+        sent[0] += 1
+
+    def publish(n):
+        for seq in range(n):
+            p = payload(fmt, seq)
+            if batch is None:
+                put(p)
+                continue
+            if not batch.add(p):
+                put(batch.pack())
+                batch.add(p)
+            if batch.full():
+                put(batch.pack())
+        if batch is not None and len(batch):
+            put(batch.pack())
+
+    messages = broker.stats.messages
+    wire = broker.stats.bytes
+    del received[:]
+    label = '{} {}'.format(fmt, 'single' if batch is None else
+                           'batch {}{}'.format(size, ' deflate' if compress else ''))
+    bench(label, publish, N)
+    client.disconnect()
+    while len(received) < sent[0]:
+        pass
+    messages = broker.stats.messages - messages
+    wire = broker.stats.bytes - wire
+    seqs = [d['seq'] for m in received for d in unpack(m)]
+    assert seqs == list(range(N)), len(seqs)
+    print('{:<40} {:>10} msgs {:>10.1f} B/reading {:>6.1f} with TCP/IP'.format(
+        '', messages, wire / N, (wire + TCPIP * messages) / N))
+
+
+# same module name as src/lib/telemetry, run it by path
+ns = {'__name__': 'host_telemetry'}
+exec(open('../host/telemetry.py').read(), ns)
+unpack = ns['unpack']
+
+for fmt in ('binary', 'json'):
+    run(fmt, 1, False)
+    for size in (8, 32):
+        run(fmt, size, False)
+        run(fmt, size, True)
@@ -0,0 +1,159 @@
+# Minimal MQTT 3.1.1 broker stand-in for testing the device code on Linux.
+# CPython only:
+#
+#   python3 mqtt_broker.py [--port 1883] [--drop 5,12.5] [--log FILE]
+#                          [--latency MS]
+#
+# Handles CONNECT, PUBLISH (QoS 0/1), SUBSCRIBE, PINGREQ and DISCONNECT,
+# forwards messages to subscribers and prints counters on Ctrl-C. --drop
+# closes all client connections at the given seconds after start, --log
+# appends every received payload as a line to FILE, --latency delays
+# every PUBACK like a broker that far away.
+
+import argparse
+import asyncio
+import time
+
+
+def packet(op, body):
+    hdr = bytearray([op])
+    sz = len(body)
+    while sz > 0x7f:
+        hdr.append((sz & 0x7f) | 0x80)
+        sz >>= 7
+    hdr.append(sz)
+    return bytes(hdr) + body
+
+
+class Stats:
+
+    def __init__(self):
+        self.connects = 0
+        self.packets = {}
+        self.messages = 0
+        self.payload_bytes = 0
+        self.bytes = 0
+        self.recvs = 0
+        self.dropped = 0
+
+    def __str__(self):
+        return ('connects {} messages {} payload {}B received {}B in {} reads, '
+                'packets {}, drops {}'.format(
+                    self.connects, self.messages, self.payload_bytes, self.bytes,
+                    self.recvs, self.packets, self.dropped))
+
+
+class Broker:
+
+    def __init__(self, on_publish=None, latency=0):
+        self.stats = Stats()
+        self.latency = latency
+        self.subs = []  # (topic, writer)
+        self.writers = set()
+        self.on_publish = on_publish
+
+    async def _read(self, reader, n):
+        data = await reader.readexactly(n)
+        self.stats.recvs += 1
+        self.stats.bytes += n
+        return data
+
+    async def client(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                op = (await self._read(reader, 1))[0]
+                sz = 0
+                sh = 0
+                while True:
+                    b = (await self._read(reader, 1))[0]
+                    sz |= (b & 0x7f) << sh
+                    if not b & 0x80:
+                        break
+                    sh += 7
+                body = await self._read(reader, sz) if sz else b''
+                kind = op & 0xf0
+                self.stats.packets[kind] = self.stats.packets.get(kind, 0) + 1
+                if kind == 0x10:
+                    self.stats.connects += 1
+                    writer.write(b'\x20\x02\x00\x00')
+                elif kind == 0x30:
+                    i = 2 + (body[0] << 8 | body[1])
+                    topic = body[2:i]
+                    if op & 6:
+                        ack = b'\x40\x02' + body[i:i + 2]
+                        if self.latency:
+                            asyncio.get_running_loop().call_later(
+                                self.latency, lambda a=ack: writer.is_closing() or writer.write(a))
+                        else:
+                            writer.write(ack)
+                        i += 2
+                    self.stats.messages += 1
+                    self.stats.payload_bytes += len(body) - i
+                    if self.on_publish:
+                        self.on_publish(topic, body[i:], op)
+                    fwd = None
+                    for t, w in self.subs:
+                        if t == topic and w is not writer:
+                            fwd = fwd or packet(0x30, body[:2 + len(topic)] + body[i:])
+                            w.write(fwd)
+                elif kind == 0x80:
+                    tl = body[2] << 8 | body[3]
+                    self.subs.append((body[4:4 + tl], writer))
+                    writer.write(b'\x90\x03' + body[0:2] + b'\x00')
+                elif kind == 0xc0:
+                    writer.write(b'\xd0\x00')
+                elif kind == 0xe0:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            self.subs = [(t, w) for t, w in self.subs if w is not writer]
+            writer.close()
+
+    def drop_all(self):
+        self.stats.dropped += 1
+        for w in list(self.writers):
+            w.transport.abort()
+
+
+async def serve(port, drops=(), on_publish=None, latency=0):
+    broker = Broker(on_publish, latency)
+    server = await asyncio.start_server(broker.client, '0.0.0.0', port)
+    loop = asyncio.get_running_loop()
+    for t in drops:
+        loop.call_later(t, broker.drop_all)
+    return broker, server
+
+
+async def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--port', type=int, default=1883)
+    p.add_argument('--drop', default='', help='comma separated seconds')
+    p.add_argument('--log', help='file to append the payloads to')
+    p.add_argument('--latency', type=float, default=0, help='PUBACK delay in ms')
+    args = p.parse_args()
+    drops = [float(t) for t in args.drop.split(',') if t]
+    log = open(args.log, 'ab', buffering=0) if args.log else None
+
+    def on_publish(topic, msg, op):
+        print(topic, msg[:60])
+        if log:
+            log.write(msg + b'\n')
+
+    broker, server = await serve(args.port, drops, on_publish, args.latency / 1000)
+    t0 = time.time()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        print('{:.1f}s {}'.format(time.time() - t0, broker.stats))
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
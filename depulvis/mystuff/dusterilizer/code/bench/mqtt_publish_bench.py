@@ -0,0 +1,136 @@
+# PUBLISH from umqtt.simple into a local TCP sink: the former one write
+# per packet part against the single buffer publish() and publish_many().
+# Counts write calls (syscalls) per message and, on Linux CPython, the TCP
+# segments sent (tcpi_segs_out of TCP_INFO). Nagle is turned off so that,
+# as on a link that acknowledges promptly, every write can leave as its
+# own segment instead of being corked behind the previous one.
+#
+#   cd bench && python3 mqtt_publish_bench.py   # or micropython
+
+from _bench import bench
+import sys
+import _thread
+import ustruct as struct
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+    sys.modules['usocket'] = socket
+from umqtt.simple import MQTTClient
+
+N = 5000
+BATCH = 8
+TOPIC = b'pm'
+MSG = bytes(70)  # a binary frame
+
+
+def sink(server):
+    # Accept one client, answer its CONNECT and swallow everything after
+    conn, addr = server.accept()
+    conn.recv(64)
+    conn.send(b'\x20\x02\x00\x00')
+    while conn.recv(4096):
+        pass
+    conn.close()
+
+
+class Counting:
+    # Socket stand-in for umqtt.simple counting write calls. The CPython
+    # socket has no write(), MicroPython's does the same as sendall().
+    def __init__(self, sock):
+        self.sock = sock
+        self.writes = 0
+
+    def write(self, buf, n=None):
+        self.writes += 1
+        if n is not None:
+            buf = memoryview(buf)[:n]
+        self.sock.sendall(buf)
+
+    def read(self, n):
+        return self.sock.recv(n)
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def close(self):
+        self.sock.close()
+
+
+def segs_out(sock):
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 256)
+    except (AttributeError, OSError):
+        return None
+    return struct.unpack_from('<I', info, 136)[0]
+
+
+def connect():
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(socket.getaddrinfo('127.0.0.1', 0)[0][-1])
+    server.listen(1)
+    port = server.getsockname()[1]
+    _thread.start_new_thread(sink, (server,))
+    client = MQTTClient(b'bench', '127.0.0.1', port, buf_size=BATCH * 80)
+    sock = socket.socket()
+    sock.connect(socket.getaddrinfo('127.0.0.1', port)[0][-1])
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (AttributeError, OSError):
+        pass
+    # what MQTTClient.connect() would do, with the counting socket
+    client.sock = Counting(sock)
+    client.sock.write(b'\x10\x11\x00\x04MQTT\x04\x02\x00\x00\x00\x05bench')
+    assert client.sock.read(4) == b'\x20\x02\x00\x00'
+    return client, server
+
+
+# what MQTTClient.publish used to do for QoS 0
+def parts_publish(client, topic, msg):
+    pkt = bytearray(b"\x30\0\0\0")
+    sz = 2 + len(topic) + len(msg)
+    i = 1
+    while sz > 0x7f:
+        pkt[i] = (sz & 0x7f) | 0x80
+        sz >>= 7
+        i += 1
+    pkt[i] = sz
+    client.sock.write(pkt, i + 1)
+    client.sock.write(struct.pack("!H", len(topic)))
+    client.sock.write(topic)
+    client.sock.write(msg)
+
+
+def run(label, fn):
+    client, server = connect()
+    writes = client.sock.writes
+    segs = segs_out(client.sock.sock)
+    bench(label, lambda n: fn(client, n), N)
+    writes = client.sock.writes - writes
+    if segs is not None:
+        segs = '{:.2f}'.format((segs_out(client.sock.sock) - segs) / N)
+    print('{:<40} {:>10.2f} writes/msg {:>6} segments/msg'.format('', writes / N, segs or 'n/a'))
+    client.disconnect()
+    server.close()
+
+
+def parts(client, n):
+    for i in range(n):
+        parts_publish(client, TOPIC, MSG)
+
+
+def single(client, n):
+    for i in range(n):
+        client.publish(TOPIC, MSG)
+
+
+def many(client, n):
+    msgs = [(TOPIC, MSG)] * BATCH
+    for i in range(n // BATCH):
+        client.publish_many(msgs)
+
+
+run('publish, one write per part', parts)
+run('publish, single buffer', single)
+run('publish_many, {} per call'.format(BATCH), many)
@@ -0,0 +1,64 @@
+# Pipelined QoS 1 of umqtt.aclient against mqtt_broker.py on the MicroPython
+# unix port or on CPython with _cpython_uasyncio.py, with a far away broker
+# that drops the connection:
+#
+#   python3 mqtt_broker.py --latency 20 --drop 4 &
+#   micropython mqtt_qos1_check.py    (or python3 mqtt_qos1_check.py)
+#
+# Publishes N messages with one message in flight and with a window of
+# WINDOW, prints the throughput and whether every message was acknowledged
+# (lost ones stay pending, resent ones and those that arrive after a newer
+# one are counted by the subscriber).
+
+from _bench import ticks_us, ticks_diff
+import _cpython_uasyncio
+import uasyncio as asyncio
+from umqtt.aclient import MQTTClient
+
+N = 200
+WINDOW = 8
+
+received = []
+
+
+async def run(inflight):
+    pub = MQTTClient(b'qos1_pub', '127.0.0.1', keepalive=2, reconnect_ms=200,
+                     inflight=inflight, retry_ms=2000)
+    await pub.connect(False)
+    del received[:]
+    t0 = ticks_us()
+    i = 0
+    while i < N:
+        try:
+            await pub.publish(b'qos1', str(i), qos=1)
+            i += 1
+        except OSError:
+            await asyncio.sleep_ms(50)
+    while pub.pending():
+        await asyncio.sleep_ms(10)
+    dt = ticks_diff(ticks_us(), t0)
+    await asyncio.sleep_ms(200)
+    unique = len(set(received))
+    late = 0
+    newest = -1
+    for m in received:
+        i = int(m)
+        if i < newest:
+            late += 1
+        newest = max(newest, i)
+    print('inflight {:>2}: {:>6} msg/s, received {} missing {} resent {} out of order {}'.format(
+        inflight, N * 1000000 // dt, len(received), N - unique, len(received) - unique, late))
+    await pub.disconnect()
+
+
+async def main():
+    sub = MQTTClient(b'qos1_sub', '127.0.0.1', keepalive=2)
+    sub.set_callback(lambda t, m: received.append(m))
+    await sub.connect()
+    await sub.subscribe(b'qos1')
+    await run(1)
+    await run(WINDOW)
+    await sub.disconnect()
+
+
+asyncio.get_event_loop().run_until_complete(main())
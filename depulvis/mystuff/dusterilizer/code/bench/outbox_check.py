@@ -0,0 +1,83 @@
+# Store-and-forward through outbox.Outbox and umqtt.aclient against
+# mqtt_broker.py dropping the connection, on the MicroPython unix port or
+# on CPython with _cpython_uasyncio.py:
+#
+#   rm -f outbox.log; python3 mqtt_broker.py --drop 2,3,8,12,14,19 --log outbox.log &
+#   micropython outbox_check.py    (or python3 outbox_check.py)
+#
+# Puts N numbered messages at a steady rate with a small RAM part so the
+# outages spill to flash, waits until the outbox is empty and then checks
+# the broker's log: every sequence number arrived, oldest first apart from
+# resent duplicates. Runs with QoS 0 and then QoS 1, where a batch only
+# leaves the outbox with its PUBACKs.
+
+from _bench import ticks_us, ticks_diff
+import _cpython_uasyncio
+import os
+import ujson
+import uasyncio as asyncio
+from umqtt.aclient import MQTTClient
+from outbox import Outbox
+
+PATH = 'outbox_check.tmp'
+LOG = 'outbox.log'
+N = 300
+
+
+def cleanup():
+    try:
+        for name in os.listdir(PATH):
+            os.remove(PATH + '/' + name)
+        os.rmdir(PATH)
+    except OSError:
+        pass
+
+
+def log_lines():
+    try:
+        return [line for line in open(LOG)]
+    except OSError:
+        return []
+
+
+async def check(qos):
+    skip = len(log_lines())
+    cleanup()
+    client = MQTTClient(b'outbox_check', '127.0.0.1', keepalive=2, reconnect_ms=200)
+    client.reconnect()
+    outbox = Outbox(PATH, ram=8, max_payload=64)
+    drain = outbox.drain(client, batch=8, interval_ms=100, qos=qos)
+    asyncio.get_event_loop().create_task(drain)
+    first = outbox.next_seq
+    t0 = ticks_us()
+    for i in range(N):
+        outbox.put('check', ujson.dumps({'seq': outbox.next_seq}))
+        await asyncio.sleep_ms(30)
+    while len(outbox):
+        await asyncio.sleep_ms(100)
+    await asyncio.sleep_ms(500)
+    print('qos {} drained after {} ms, spilled {} dropped {}'.format(
+        qos, ticks_diff(ticks_us(), t0) // 1000, outbox._store.next_seq - 1, outbox.dropped))
+    asyncio.cancel(drain)
+    await client.disconnect()
+
+    got = [ujson.loads(line)['seq'] for line in log_lines()[skip:]]
+    seen = set(got)
+    missing = [s for s in range(first, first + N) if s not in seen]
+    late = 0
+    newest = 0
+    for s in got:
+        if s < newest:
+            late += 1
+        newest = max(newest, s)
+    print('received {} missing {} {} duplicates {} out of order {}'.format(
+        len(got), len(missing), missing[:10], len(got) - len(seen), late))
+
+
+async def main():
+    await check(0)
+    await check(1)
+
+
+asyncio.get_event_loop().run_until_complete(main())
+cleanup()
@@ -0,0 +1,57 @@
+# End to end put -> get latency across a chain of four queues, the same
+# depth as sensor task -> main_queue -> display/mqtt/logic queue. Compares
+# the parking Queue with the former 100 ms polling one.
+#
+# MicroPython only (uasyncio needs utimeq): micropython queue_latency_bench.py
+
+from _bench import ticks_us, ticks_diff
+import uasyncio as asyncio
+from uasyncio.queues import Queue
+
+N = 20
+HOPS = 4
+
+
+class PollingQueue(Queue):
+
+    def get(self):
+        while not self._queue:
+            yield from asyncio.sleep(0.1)
+        return self._get()
+
+    def put(self, val):
+        self._put(val)
+
+
+async def relay(q_in, q_out):
+    while True:
+        await q_out.put(await q_in.get())
+
+
+async def producer(q):
+    for i in range(N):
+        await q.put(ticks_us())
+        await asyncio.sleep_ms(50)
+
+
+async def consumer(q, res):
+    for i in range(N):
+        t = await q.get()
+        res.append(ticks_diff(ticks_us(), t))
+
+
+def run(cls):
+    loop = asyncio.get_event_loop()
+    qs = [cls() for i in range(HOPS)]
+    res = []
+    for i in range(HOPS - 1):
+        loop.create_task(relay(qs[i], qs[i + 1]))
+    loop.create_task(producer(qs[0]))
+    loop.run_until_complete(consumer(qs[-1], res))
+    res.sort()
+    print('{:<14} median {:>8} us  max {:>8} us'.format(
+        cls.__name__, res[len(res) // 2], res[-1]))
+
+
+run(PollingQueue)
+run(Queue)
@@ -0,0 +1,156 @@
+# Allocations per SPS30 sample on its way from the driver to a bus message:
+# the former driver, which decoded float by float and built a dict per
+# reading (plus the timestamp mqtt_task added to it), against the
+# preallocated PMData records filled in place. The numbers that count are
+# MicroPython's (gc.mem_alloc), CPython only shows the peak of a sample.
+
+from _bench import allocs, bench, per_op, run
+from _fake_i2c import FakeBus, FakeI2C
+import ustruct as struct
+from sps30 import SPS30
+
+N = 200
+
+
+class OldSPS30:
+    # What SPS30 did for read_measured_values() and pm_data before the
+    # records, without the 20 ms delay after writing the command
+
+    ADDRESS = 0x69
+
+    def __init__(self, i2c):
+        self._i2c = i2c
+        self._pm05_num = 0.0
+        self._pm1_num = 0.0
+        self._pm25_num = 0.0
+        self._pm4_num = 0.0
+        self._pm10_num = 0.0
+        self._pm1_mass = 0.0
+        self._pm25_mass = 0.0
+        self._pm4_mass = 0.0
+        self._pm10_mass = 0.0
+        self._typical_size = 0.0
+        self._status = ('ok', '')
+
+    @property
+    def pm_data(self):
+        return {
+            'pm05_num': self._pm05_num,
+            'pm1_num': self._pm1_num,
+            'pm25_num': self._pm25_num,
+            'pm4_num': self._pm4_num,
+            'pm10_num': self._pm10_num,
+            'pm1_mass': self._pm1_mass,
+            'pm25_mass': self._pm25_mass,
+            'pm4_mass': self._pm4_mass,
+            'pm10_mass': self._pm10_mass,
+            'typical_size': self._typical_size
+        }
+
+    def _read_i2c(self, cmd, num):
+        try:
+            self._i2c.writeto(self.ADDRESS, cmd)
+            self._status = ('ok', '')
+            return self._i2c.readfrom(self.ADDRESS, num)
+        except:
+            self._status = ('error', 'can\'t write to i2c')
+            return None
+
+    def _calc_float(self, b):
+        struct_float = struct.pack('>BBBB', b[0], b[1], b[3], b[4])
+        float_values = struct.unpack('>f', struct_float)
+        crc1 = self._calc_crc(b[0:2])
+        crc2 = self._calc_crc(b[3:5])
+        if crc1 == bytes([b[2]]) and crc2 == bytes([b[5]]):
+            return float_values[0]
+        return None
+
+    def _calc_crc(self, data):
+        crc = 0xFF
+        for i in range(2):
+            crc = (crc ^ data[i]) & 0xFF
+            for bit in range(8, 0, -1):
+                if crc & 0x80:
+                    crc = ((crc << 1) ^ 0x31) & 0xFF
+                else:
+                    crc = ((crc << 1)) & 0xFF
+        return bytes([crc])
+
+    def read_measured_values(self):
+        data = self._read_i2c(b'\x03\x00', 60)
+        pm1_mass = self._pm1_mass
+        pm25_mass = self._pm25_mass
+        pm4_mass = self._pm4_mass
+        pm10_mass = self._pm10_mass
+        pm05_num = self._pm05_num
+        pm1_num = self._pm1_num
+        pm25_num = self._pm25_num
+        pm4_num = self._pm4_num
+        pm10_num = self._pm10_num
+        typical_size = self._typical_size
+        try:
+            pm1_mass = self._calc_float(data[0:6])
+            pm25_mass = self._calc_float(data[6:12])
+            pm4_mass = self._calc_float(data[12:18])
+            pm10_mass = self._calc_float(data[18:24])
+            pm05_num = self._calc_float(data[24:30])
+            pm1_num = self._calc_float(data[30:36])
+            pm25_num = self._calc_float(data[36:42])
+            pm4_num = self._calc_float(data[42:48])
+            pm10_num = self._calc_float(data[48:54])
+            typical_size = self._calc_float(data[54:60])
+            self._status = ('ok', '')
+        except Exception as e:
+            self._status = ('error', e)
+        if pm1_mass:
+            self._pm1_mass = pm1_mass
+        if pm25_mass:
+            self._pm25_mass = pm25_mass
+        if pm4_mass:
+            self._pm4_mass = pm4_mass
+        if pm10_mass:
+            self._pm10_mass = pm10_mass
+        if pm05_num:
+            self._pm05_num = pm05_num
+        if pm1_num:
+            self._pm1_num = pm1_num
+        if pm25_num:
+            self._pm25_num = pm25_num
+        if pm4_num:
+            self._pm4_num = pm4_num
+        if pm10_num:
+            self._pm10_num = pm10_num
+        if typical_size:
+            self._typical_size = typical_size
+        if self._pm1_mass < 0 or self._pm1_mass > 1000 or self._pm25_mass < 0 or self._pm25_mass > 1000 or self._pm4_mass < 0 or self._pm4_mass > 1000 or self._pm10_mass < 0 or self._pm10_mass > 1000 or self._pm05_num < 0 or self._pm05_num > 3000 or self._pm1_num < 0 or self._pm1_num > 3000 or self._pm25_num < 0 or self._pm25_num > 3000 or self._pm4_num < 0 or self._pm4_num > 3000 or self._pm10_num < 0 or self._pm10_num > 3000:
+            self._status = ('error', 'PM values out of range')
+        else:
+            self._status = ('ok', '')
+
+
+old = OldSPS30(FakeI2C())
+sps30 = SPS30(FakeBus())
+
+
+def dict_samples(n):
+    for i in range(n):
+        old.read_measured_values()
+        msg = ('sps30_data', old.pm_data)
+        msg[1]['timestamp'] = i
+
+
+def record_samples(n):
+    for i in range(n):
+        run(sps30.read_measured_values())
+        msg = ('sps30_data', sps30.pm_data)
+
+
+dict_samples(1)
+record_samples(1)
+assert old.pm_data['pm10_num'] == sps30.pm_data.pm10_num
+for label, fn in (('dict per sample', dict_samples), ('record in place', record_samples)):
+    a = allocs(fn, N)
+    print('{:<20} {:>6} bytes/sample'.format(label, per_op(a, N)))
+    bench('  time', fn, N)
+
+print(sps30.pm_data)
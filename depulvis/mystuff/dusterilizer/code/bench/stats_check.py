@@ -0,0 +1,59 @@
+# Checks stats.Rolling against a plain recomputation of the window, with
+# values that float32 rounds (the window buffer is an array('f')), some
+# just below a bin edge. Runs on the MicroPython unix port and CPython:
+#
+#   cd bench && python3 stats_check.py
+
+import _bench
+from array import array
+from stats import Rolling
+
+SIZE = 8
+LO = 0.0
+HI = 100.0
+BINS = 32
+
+
+def values():
+    # just below, on and just above the edges of the first bins, and
+    # values with no exact float32
+    width = (HI - LO) / BINS
+    for b in range(1, 6):
+        edge = LO + b * width
+        yield edge - 1e-11
+        yield edge
+        yield edge + 1e-11
+    for i in range(40):
+        yield i * 2.3 + 0.1
+    yield 3.12499999999
+    yield 50
+    yield 60
+    yield 70
+
+
+def check():
+    r = Rolling(size=SIZE, lo=LO, hi=HI, bins=BINS)
+    f32 = array('f', [0.0])
+    window = []
+    n = 0
+    for x in values():
+        r.update(x)
+        f32[0] = x
+        window.append(f32[0])
+        window = window[-SIZE:]
+        hist = [0] * BINS
+        for v in window:
+            hist[r._bin(v)] += 1
+        assert list(r._hist) == hist, (x, list(r._hist), hist)
+        assert r.min == min(window) and r.max == max(window), x
+        assert abs(r.mean - sum(window) / len(window)) < 1e-4, x
+        n += 1
+    # the reviewer's case: two slots, values leave the window again
+    r = Rolling(size=2, lo=0, hi=100)
+    for x in (3.12499999999, 50, 60, 70):
+        r.update(x)
+    assert sum(r._hist) == 2, list(r._hist)
+    print('Rolling ok after {} values'.format(n))
+
+
+check()
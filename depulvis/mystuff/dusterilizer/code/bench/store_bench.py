@@ -0,0 +1,87 @@
+# Append and scan throughput of store.RingStore with frame sized records
+# (timestamp + 14 floats) and the time to reopen it (head recovery).
+# Wraps the ring twice so the numbers include overwriting. Ends with a
+# check of reading across the wrap of a single segment store.
+
+from _bench import bench, ticks_us, ticks_diff
+import os
+from store import RingStore
+
+PATH = 'store_bench.tmp'
+FMT = 'I14f'
+SEGMENT_RECORDS = 256
+SEGMENTS = 8
+N = SEGMENT_RECORDS * SEGMENTS * 2
+VALUES = [0.5 * i for i in range(14)]
+
+
+def cleanup():
+    try:
+        for name in os.listdir(PATH):
+            os.remove(PATH + '/' + name)
+        os.rmdir(PATH)
+    except OSError:
+        pass
+
+
+def open_store(flush_every=8):
+    return RingStore(PATH, FMT, SEGMENT_RECORDS, SEGMENTS, flush_every)
+
+
+def appends(store):
+    def run(n):
+        for t in range(n):
+            store.append(t, *VALUES)
+        store.flush()
+    return run
+
+
+cleanup()
+t0 = ticks_us()
+store = open_store()
+print('{:<40} {:>10} us'.format('create {} segments'.format(SEGMENTS), ticks_diff(ticks_us(), t0)))
+print('record {} bytes, capacity {} records'.format(store.size, store.capacity))
+
+for flush_every in (1, 8, 32):
+    cleanup()
+    store = open_store(flush_every)
+    bench('append, flush every {}'.format(flush_every), appends(store), N)
+
+
+def scan(n):
+    count = 0
+    for rec in store.read():
+        count += 1
+    assert count == store.capacity
+
+
+def time_range(n):
+    for i in range(n):
+        t = N - store.capacity + i * 97 % (store.capacity - 60)
+        count = 0
+        for rec in store.range(t, t + 60):
+            count += 1
+        assert count == 60, count
+
+
+bench('scan {} records'.format(store.capacity), scan, 1)
+bench('time range of 60 records', time_range, 20)
+
+t0 = ticks_us()
+store = open_store()
+print('{:<40} {:>10} us'.format('reopen (recover head)', ticks_diff(ticks_us(), t0)))
+assert store.next_seq == N + 1, store.next_seq
+
+# a single segment wraps back to its own start, read across that after a
+# reopen
+for n in range(1, 12):
+    cleanup()
+    store = RingStore(PATH, 'If', 4, 1, 8)
+    for t in range(n):
+        store.append(t, 0.5 * t)
+    store.flush()
+    store = RingStore(PATH, 'If', 4, 1, 8)
+    got = [rec[1] for rec in store.read()]
+    assert got == list(range(max(0, n - 4), n)), (n, got)
+print('single segment wrap, reopen and read ok')
+cleanup()
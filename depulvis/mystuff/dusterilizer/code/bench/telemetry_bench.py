@@ -0,0 +1,91 @@
+# Serialization of the MQTT payloads: ujson.dumps of as_dict() against
+# telemetry.Encoder, time, allocations and bytes on the wire for an event
+# frame and for a summary of three fields. On CPython the binary payloads
+# are also checked against host/telemetry.py.
+
+from _bench import allocs, bench, load, per_op
+import sys
+import ujson
+from record import Record
+try:
+    from stats import Aggregate
+except ImportError:
+    # CPython: the standard library shadows collections
+    import types
+    sys.modules['collections.deque'] = types.ModuleType('collections.deque')
+    sys.modules['collections.deque'].deque = load('collections/deque.py', 'deque')
+    from stats import Aggregate
+from telemetry import Encoder
+
+N = 1000
+
+
+class Frame(Record):
+    # same table as tasks.acquisition_task.Frame, without the drivers
+    FIELDS = ('pm1_mass', 'pm25_mass', 'pm4_mass', 'pm10_mass',
+              'pm05_num', 'pm1_num', 'pm25_num', 'pm4_num', 'pm10_num',
+              'typical_size', 'humidity', 'temperature', 'eco2', 'tvoc')
+
+
+rec = Frame()
+for i in range(len(Frame.FIELDS)):
+    rec[i] = 1.5 * i + 0.25
+rec.timestamp = 719000000
+agg = Aggregate(Frame, ('pm10_mass', 'eco2', 'tvoc'))
+for t in range(60):
+    rec.timestamp += 1
+    rec['pm10_mass'] = t * 0.5
+    agg.update(rec)
+encoder = Encoder(Frame.FIELDS)
+
+
+def json_frame(n):
+    for seq in range(n):
+        d = rec.as_dict()
+        d['seq'] = seq
+        bytes(ujson.dumps(d), 'utf-8')
+
+
+def binary_frame(n):
+    for seq in range(n):
+        bytes(encoder.frame(seq, rec))
+
+
+def json_summary(n):
+    for seq in range(n):
+        d = agg.as_dict()
+        d['seq'] = seq
+        bytes(ujson.dumps(d), 'utf-8')
+
+
+def binary_summary(n):
+    for seq in range(n):
+        bytes(encoder.summary(seq, agg))
+
+
+for label, fn, size in (
+        ('frame json', json_frame, len(ujson.dumps(rec.as_dict())) + 10),
+        ('frame binary', binary_frame, len(encoder.frame(0, rec))),
+        ('summary json', json_summary, len(ujson.dumps(agg.as_dict())) + 10),
+        ('summary binary', binary_summary, len(encoder.summary(0, agg)))):
+    bench(label, fn, N)
+    print('{:<40} {:>10} B/op {:>10} bytes'.format('', per_op(allocs(fn, N), N), size))
+
+if sys.implementation.name == 'cpython':
+    # same module name as src/lib/telemetry, run it by path
+    ns = {'__name__': 'host_telemetry'}
+    exec(open('../host/telemetry.py').read(), ns)
+    decode = ns['decode']
+    d = decode(bytes(encoder.frame(7, rec)))
+    assert d['seq'] == 7 and d['timestamp'] == rec.timestamp, d
+    for name in Frame.FIELDS:
+        assert abs(d[name] - rec[name]) < 1e-4, name
+    d = decode(bytes(encoder.summary(8, agg)))
+    ref = agg.as_dict()
+    assert d['n'] == 60 and d['start'] == ref['start'] and d['timestamp'] == ref['timestamp'], d
+    for name in agg.fields:
+        for a, b in zip(d[name], ref[name]):
+            assert abs(a - b) < 1e-3, (name, d[name], ref[name])
+    assert decode(bytes(encoder.alarm(9, 'on'))) == {'seq': 9, 'alarm': 'on'}
+    assert decode(ujson.dumps({'seq': 10, 'alarm': 'off'}).encode()) == {'seq': 10, 'alarm': 'off'}
+    print('host decoder round trip ok')
@@ -0,0 +1,53 @@
+# One SPS30 measurement frame from the (fake) bus to ten floats: reading a
+# new bytes object and decoding a copy of its payload against reading into
+# the driver's preallocated buffer, compacting it in place and a single
+# unpack_from. Also timed end to end through SPS30.read_measured_values.
+
+from _bench import allocs, bench, per_op, run
+import ustruct as struct
+from _fake_i2c import FakeI2C, FakeBus
+from sensirion import check_frame, compact, payload
+from sps30 import SPS30
+
+N = 500
+
+i2c = FakeI2C()
+CMD = b'\x03\x00'
+buf = bytearray(60)
+frame = memoryview(buf)
+
+
+def copying(n):
+    for _ in range(n):
+        i2c.writeto(0x69, CMD)
+        data = i2c.readfrom(0x69, 60)
+        if check_frame(data):
+            values = struct.unpack('>10f', payload(data))
+    return values
+
+
+def in_place(n):
+    for _ in range(n):
+        i2c.writeto(0x69, CMD)
+        i2c.readfrom_into(0x69, frame)
+        if compact(frame) >= 0:
+            values = struct.unpack_from('>10f', buf)
+    return values
+
+
+sps30 = SPS30(FakeBus(i2c))
+
+
+def driver(n):
+    for _ in range(n):
+        run(sps30.read_measured_values())
+
+
+assert copying(1) == in_place(1)
+for label, fn in (('readfrom, copy payload, unpack', copying),
+                  ('readfrom_into, compact, unpack_from', in_place),
+                  ('SPS30.read_measured_values', driver)):
+    bench(label, fn, N)
+    print('{:<40} {:>10} bytes/frame'.format('', per_op(allocs(fn, N), N)))
+
+print(sps30.pm_data)
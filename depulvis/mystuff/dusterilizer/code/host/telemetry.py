@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Decoder for the MQTT payloads of src/tasks/mqtt_task.py, for the
+# backend. Plain CPython, no dependencies:
+#
+#   from telemetry import decode, unpack
+#   d = decode(payload)
+#   for d in unpack(payload): # also batches
+#
+#   python3 telemetry.py 0100070000... # hex payloads from the command line
+#
+# decode() accepts both formats and returns the dict the JSON format
+# carries, so consumers don't need to know which one a device uses.
+# unpack() also opens batches, returning a list of such dicts.
+
+import json
+import struct
+import sys
+import zlib
+
+FRAME = 0
+SUMMARY = 1
+ALARM = 2
+BATCH = 3
+DEFLATED = 0x80
+
+# field tables per layout version, src/lib/telemetry/core.py describes
+# the layout, Frame.FIELDS in src/tasks/acquisition_task.py the table
+FIELDS = {
+    1: ('pm1_mass', 'pm25_mass', 'pm4_mass', 'pm10_mass',
+        'pm05_num', 'pm1_num', 'pm25_num', 'pm4_num', 'pm10_num',
+        'typical_size', 'humidity', 'temperature', 'eco2', 'tvoc'),
+}
+
+
+def _names(version, mask):
+    return [name for i, name in enumerate(FIELDS[version]) if mask >> i & 1]
+
+
+def decode(payload):
+    """Return the message in payload as dict, see the module comment."""
+    payload = bytes(payload)
+    if payload[:1] == b'{':
+        return json.loads(payload)
+    version, kind, seq = struct.unpack_from('<BBI', payload)
+    if version not in FIELDS:
+        raise ValueError('unknown payload version {}'.format(version))
+    if kind & ~DEFLATED == BATCH:
+        raise ValueError('batch payload, use unpack()')
+    if kind == FRAME:
+        timestamp, mask = struct.unpack_from('<II', payload, 6)
+        names = _names(version, mask)
+        values = struct.unpack_from('<{}f'.format(len(names)), payload, 14)
+        d = dict(zip(names, values))
+        d['timestamp'] = timestamp
+    elif kind == SUMMARY:
+        timestamp, start, n, mask = struct.unpack_from('<IIHI', payload, 6)
+        names = _names(version, mask)
+        values = struct.unpack_from('<{}f'.format(4 * len(names)), payload, 20)
+        d = {name: list(values[4 * i:4 * i + 4]) for i, name in enumerate(names)}
+        d.update(start=start, timestamp=timestamp, n=n)
+    elif kind == ALARM:
+        d = {'alarm': 'on' if payload[6] else 'off'}
+    else:
+        raise ValueError('unknown payload kind {}'.format(kind))
+    d['seq'] = seq
+    return d
+
+
+def unpack(payload):
+    """Return the messages in payload, a batch or a single one, as list
+    of dicts like decode() returns."""
+    payload = bytes(payload)
+    if payload[:1] == b'{' or payload[1] & ~DEFLATED != BATCH:
+        return [decode(payload)]
+    version, kind, count = struct.unpack_from('<BBH', payload)
+    if version not in FIELDS:
+        raise ValueError('unknown payload version {}'.format(version))
+    body = payload[4:]
+    if kind & DEFLATED:
+        body = zlib.decompress(body)
+    msgs = []
+    i = 0
+    for _ in range(count):
+        n, = struct.unpack_from('<H', body, i)
+        msgs.append(decode(body[i + 2:i + 2 + n]))
+        i += 2 + n
+    return msgs
+
+
+if __name__ == '__main__':
+    for arg in sys.argv[1:]:
+        for d in unpack(bytes.fromhex(arg)):
+            print(d)
@@ -0,0 +1 @@
+from bus.core import *
@@ -0,0 +1,59 @@
+from uasyncio.queues import Queue, QueueFull
+
+
+class Bus:
+    """In-process publish/subscribe message bus.
+
+    Subscribers own a queue and register it for one or more topics (or '*'
+    for every topic). publish() builds one (topic, data) message and hands
+    the same object to every subscribed queue, it never blocks: if a queue
+    is full the message is dropped for that subscriber and counted in
+    dropped.
+    :param maxsize: Size of queues created by subscribe().
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._subs = {}
+
+    def subscribe(self, topics, queue=None):
+        """Deliver messages of the given topics to queue (a new bounded
+        Queue if None) and return the queue.
+        """
+        if queue is None:
+            queue = Queue(self.maxsize)
+        for topic in topics:
+            self._subs.setdefault(topic, []).append(queue)
+        return queue
+
+    def backlog(self, topic):
+        """Most messages of topic a subscriber can have waiting: the
+        largest maxsize of the queues subscribed to it (or to '*'), None if
+        one of them is unbounded.
+        """
+        n = 0
+        for subs in (self._subs.get(topic), self._subs.get('*')):
+            for queue in subs or ():
+                if queue.maxsize <= 0:
+                    return None
+                n = max(n, queue.maxsize)
+        return n
+
+    def unsubscribe(self, queue):
+        for subs in self._subs.values():
+            while queue in subs:
+                subs.remove(queue)
+
+    def publish(self, topic, data=None):
+        msg = (topic, data)
+        self._deliver(self._subs.get(topic), msg)
+        self._deliver(self._subs.get('*'), msg)
+
+    def _deliver(self, subs, msg):
+        if subs:
+            for queue in subs:
+                try:
+                    queue.put_nowait(msg)
+                except QueueFull:
+                    self.dropped += 1
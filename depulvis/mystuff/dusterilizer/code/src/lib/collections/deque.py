@@ -1,37 +1,126 @@
 class deque:
+    """Circular buffer deque.
 
-    def __init__(self, iterable=None):
-        if iterable is None:
-            self.q = []
-        else:
-            self.q = list(iterable)
+    Items live in a preallocated list indexed by a head pointer, so append,
+    appendleft, pop and popleft are O(1) and don't allocate in steady state.
 
-    def popleft(self):
-        return self.q.pop(0)
+    If maxlen is None the buffer doubles when it runs full. Otherwise the
+    capacity is fixed: a full deque either raises IndexError or, with
+    overwrite=True, drops the item at the opposite end (like CPython's
+    collections.deque with maxlen). With maxlen=0 it stays empty, every
+    item counts as dropped right away.
+    """
+
+    def __init__(self, iterable=None, maxlen=None, overwrite=False):
+        self.maxlen = maxlen
+        self.overwrite = overwrite
+        self._buf = [None] * (8 if maxlen is None else maxlen)
+        self._head = 0
+        self._len = 0
+        if iterable is not None:
+            self.extend(iterable)
+
+    def _grow(self):
+        buf = self._buf
+        cap = len(buf)
+        head = self._head
+        self._buf = buf[head:] + buf[:head] + [None] * cap
+        self._head = 0
 
-    def popright(self):
-        return self.q.pop()
+    def _full(self):
+        # Called when the buffer is full. Returns True if the caller has to
+        # make room by dropping an item.
+        if self.maxlen is None:
+            self._grow()
+            return False
+        if not self.overwrite:
+            raise IndexError('deque full')
+        return True
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError('pop from an empty deque')
+        buf = self._buf
+        head = self._head
+        a = buf[head]
+        buf[head] = None
+        self._head = (head + 1) % len(buf)
+        self._len -= 1
+        return a
 
     def pop(self):
-        return self.q.pop()
+        if not self._len:
+            raise IndexError('pop from an empty deque')
+        self._len -= 1
+        buf = self._buf
+        i = (self._head + self._len) % len(buf)
+        a = buf[i]
+        buf[i] = None
+        return a
+
+    popright = pop
 
     def append(self, a):
-        self.q.append(a)
+        if self._len == len(self._buf) and self._full():
+            if not self._len:
+                return
+            self.popleft()
+        buf = self._buf
+        buf[(self._head + self._len) % len(buf)] = a
+        self._len += 1
 
     def appendleft(self, a):
-        self.q.insert(0, a)
+        if self._len == len(self._buf) and self._full():
+            if not self._len:
+                return
+            self.pop()
+        buf = self._buf
+        self._head = (self._head - 1) % len(buf)
+        buf[self._head] = a
+        self._len += 1
 
     def extend(self, a):
-        self.q.extend(a)
+        for x in a:
+            self.append(x)
+
+    def clear(self):
+        buf = self._buf
+        for i in range(len(buf)):
+            buf[i] = None
+        self._head = 0
+        self._len = 0
+
+    def remove(self, a):
+        # O(n), meant for short deques (e.g. lists of waiting tasks)
+        buf = self._buf
+        cap = len(buf)
+        for i in range(self._len):
+            if buf[(self._head + i) % cap] == a:
+                for j in range(i, self._len - 1):
+                    buf[(self._head + j) % cap] = buf[(self._head + j + 1) % cap]
+                self._len -= 1
+                buf[(self._head + self._len) % cap] = None
+                return
+        raise ValueError('deque.remove(x): x not in deque')
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('deque index out of range')
+        return self._buf[(self._head + i) % len(self._buf)]
 
     def __len__(self):
-        return len(self.q)
+        return self._len
 
     def __bool__(self):
-        return bool(self.q)
+        return self._len > 0
 
     def __iter__(self):
-        yield from self.q
+        buf = self._buf
+        cap = len(buf)
+        for i in range(self._len):
+            yield buf[(self._head + i) % cap]
 
     def __str__(self):
-        return 'deque({})'.format(self.q)
+        return 'deque({})'.format(list(self))
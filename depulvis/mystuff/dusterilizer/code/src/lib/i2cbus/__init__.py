@@ -0,0 +1 @@
+from i2cbus.core import *
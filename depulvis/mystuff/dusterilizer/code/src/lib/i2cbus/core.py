@@ -0,0 +1,86 @@
+import uasyncio as asyncio
+from uasyncio.synchro import Lock
+import utime
+
+
+class I2CBus:
+    """Shared asynchronous access to an `I2C` bus.
+
+    Transactions from all tasks are serialized by a lock. The time a device
+    needs between a command and reading the result is awaited with the bus
+    released, so other devices and tasks run meanwhile. stats maps each
+    address to [transactions, errors, total latency us, max latency us],
+    latency being measured from the request (including waiting for the bus)
+    to the end of the transaction.
+    :param i2c: The `I2C` object to use.
+    """
+
+    def __init__(self, i2c):
+        self.i2c = i2c
+        self.lock = Lock()
+        self.stats = {}
+
+    def _start(self, addr):
+        st = self.stats.get(addr)
+        if st is None:
+            st = self.stats[addr] = [0, 0, 0, 0]
+        return st, utime.ticks_us()
+
+    def _done(self, st, t0):
+        dt = utime.ticks_diff(utime.ticks_us(), t0)
+        st[0] += 1
+        st[2] += dt
+        if dt > st[3]:
+            st[3] = dt
+
+    async def _locked(self, st, fn, *args):
+        await self.lock.acquire()
+        try:
+            return fn(*args)
+        except Exception:
+            st[1] += 1
+            raise
+        finally:
+            self.lock.release()
+
+    async def write(self, addr, data, delay_ms=0):
+        """Write data, then wait delay_ms before the device is used again."""
+        st, t0 = self._start(addr)
+        await self._locked(st, self.i2c.writeto, addr, data)
+        if delay_ms:
+            await asyncio.sleep_ms(delay_ms)
+        self._done(st, t0)
+
+    async def read(self, addr, cmd, n, delay_ms=0):
+        """Write cmd, wait delay_ms and read n bytes."""
+        st, t0 = self._start(addr)
+        await self._locked(st, self.i2c.writeto, addr, cmd)
+        if delay_ms:
+            await asyncio.sleep_ms(delay_ms)
+        data = await self._locked(st, self.i2c.readfrom, addr, n)
+        self._done(st, t0)
+        return data
+
+    async def read_into(self, addr, cmd, buf, delay_ms=0):
+        """Like read() but fill buf (e.g. a preallocated bytearray or
+        memoryview) instead of allocating the result."""
+        st, t0 = self._start(addr)
+        await self._locked(st, self.i2c.writeto, addr, cmd)
+        if delay_ms:
+            await asyncio.sleep_ms(delay_ms)
+        await self._locked(st, self.i2c.readfrom_into, addr, buf)
+        self._done(st, t0)
+
+    async def scan(self):
+        """Return the addresses of the devices that answer, like I2C.scan(),
+        without getting in the way of a running transaction."""
+        await self.lock.acquire()
+        try:
+            return self.i2c.scan()
+        finally:
+            self.lock.release()
+
+    def print_stats(self):
+        for addr, st in self.stats.items():
+            print('i2c 0x{:02x}: {} transactions {} errors avg {}us max {}us'.format(
+                addr, st[0], st[1], st[2] // st[0] if st[0] else 0, st[3]))
@@ -0,0 +1,182 @@
+import uasyncio as asyncio
+from uasyncio.core import wait_on, wake
+from collections.deque import deque
+from store import RingStore
+import ustruct as struct
+
+# Sequence numbers are reserved on flash in blocks of this size, after a
+# reboot numbering continues at the next block
+SEQ_BLOCK = 256
+TOPIC_MAX = 32
+
+
+class Outbox:
+    """Bounded store-and-forward queue between the pipeline and an MQTT
+    client.
+
+    put() never blocks or fails. Messages wait in RAM. Once ram of them
+    pile up (the broker is unreachable) the oldest move to a `RingStore`
+    in path, which keeps the newest ones when that fills up as well
+    (counted in dropped). drain() sends them oldest first in rate limited
+    batches whenever the client is connected. Every message has a sequence
+    number (next_seq when it is built) that increases across reboots, so
+    the backend can drop duplicates: a message is only removed after
+    publish() returned, with qos 1 after its PUBACK, one may be sent twice
+    after a broken connection or a reboot. Only the flash part survives a
+    reboot, the up to ram messages still in RAM are lost with it.
+    :param path: Directory for the flash spill, None keeps RAM only.
+    :param max_payload: Longest payload that can spill, longer ones are
+                        dropped instead.
+    """
+
+    def __init__(self, path=None, ram=32, max_payload=1024, segment_records=32, segments=4):
+        self._ram = deque(maxlen=ram, overwrite=path is None)
+        self._waiters = []
+        self._pids = []  # qos 1 messages of the batch not acknowledged yet
+        self._acks = []  # drain() waiting for them
+        self.dropped = 0
+        self._store = None
+        self._seq = 1
+        self._seq_limit = 0
+        if path is not None:
+            self._fmt = 'IB{}sH{}s'.format(TOPIC_MAX, max_payload)
+            self._max_payload = max_payload
+            # spills are rare and records big, write each one right away
+            self._store = RingStore(path, self._fmt, segment_records, segments, 1)
+            self._path = path
+            self._seq = self._load(path + '/seq')
+            # store seq of the oldest spilled message not sent yet
+            self._flash = min(self._load(path + '/sent'), self._store.next_seq)
+            self._sent = self._flash
+
+    def _load(self, name):
+        try:
+            with open(name, 'rb') as f:
+                return struct.unpack('<I', f.read(4))[0]
+        except (OSError, ValueError):
+            return 1
+
+    def _save(self, name, value):
+        with open(name, 'wb') as f:
+            f.write(struct.pack('<I', value))
+
+    @property
+    def next_seq(self):
+        """Sequence number of the next message put()."""
+        return self._seq
+
+    def __len__(self):
+        n = len(self._ram)
+        store = self._store
+        if store is not None:
+            n += store.next_seq - max(self._flash, store.first_seq)
+        return n
+
+    def new_seq(self):
+        """Take a sequence number without queuing anything, for messages
+        that travel inside a batch and are put later."""
+        seq = self._seq
+        if self._store is not None and seq >= self._seq_limit:
+            self._seq_limit = seq + SEQ_BLOCK
+            self._save(self._path + '/seq', self._seq_limit)
+        self._seq += 1
+        return seq
+
+    def put(self, topic, payload, seq=None):
+        """Queue payload for topic, returns its sequence number. A batch
+        passes the number new_seq() gave one of its messages instead of
+        using up one of its own."""
+        if seq is None:
+            seq = self.new_seq()
+        ram = self._ram
+        if len(ram) == ram.maxlen:
+            if self._store is None:
+                self.dropped += 1  # the deque overwrites the oldest
+            else:
+                self._spill(ram.popleft())
+        ram.append((seq, topic, payload))
+        wake(self._waiters)
+        return seq
+
+    def _spill(self, msg):
+        seq, topic, payload = msg
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if len(payload) > self._max_payload or len(topic) > TOPIC_MAX:
+            self.dropped += 1
+            return
+        # when full the store overwrites its oldest record, _peek()
+        # counts that
+        self._store.append(seq, len(topic), topic, len(payload), payload)
+
+    def _peek(self, i):
+        # The i-th oldest message: flash holds older ones than RAM. Spills
+        # only ever move RAM's oldest to the end of flash, a message keeps
+        # its place until _pop() or the store overwrites it.
+        store = self._store
+        if store is not None:
+            if self._flash < store.first_seq:
+                self.dropped += store.first_seq - self._flash
+                self._flash = store.first_seq
+            if self._flash + i < store.next_seq:
+                rec = store.get(self._flash + i)
+                return rec[1], rec[3][:rec[2]], rec[5][:rec[4]]
+            i -= store.next_seq - self._flash
+        return self._ram[i] if i < len(self._ram) else None
+
+    def _pop(self, seq):
+        store = self._store
+        if store is not None and self._flash < store.next_seq:
+            self._flash += 1
+        elif self._ram and self._ram[0][0] == seq:
+            self._ram.popleft()
+
+    def _ack(self, pid):
+        pids = self._pids
+        if pid in pids:
+            pids.remove(pid)
+            if not pids:
+                wake(self._acks)
+
+    async def drain(self, client, batch=8, interval_ms=1000, retry_ms=500, qos=0):
+        """Task publishing the queued messages with client, at most batch
+        every interval_ms. With qos 1 a batch stays queued until the client
+        reported all its PUBACKs, it resends them until then."""
+        if qos:
+            client.set_ack_callback(self._ack)
+        while True:
+            if not client.isconnected():
+                await asyncio.sleep_ms(retry_ms)
+                continue
+            if self._peek(0) is None:
+                await wait_on(self._waiters)
+                continue
+            sent = []
+            try:
+                while len(sent) < batch:
+                    msg = self._peek(len(sent))
+                    if msg is None:
+                        break
+                    pid = await client.publish(msg[1], msg[2], qos=qos)
+                    if qos:
+                        self._pids.append(pid)
+                    sent.append(msg[0])
+            except OSError:
+                # the client reconnects in the background, the rest of
+                # the batch goes out next time
+                pass
+            while self._pids:
+                await wait_on(self._acks)
+            for seq in sent:
+                # skips those the store overwrote meanwhile
+                msg = self._peek(0)
+                if msg is not None and msg[0] == seq:
+                    self._pop(seq)
+            if self._store is not None and self._flash != self._sent:
+                # remember once per batch what left the flash
+                self._sent = self._flash
+                self._save(self._path + '/sent', self._sent)
+            if self._peek(0) is not None:
+                await asyncio.sleep_ms(interval_ms)
@@ -0,0 +1 @@
+from record.core import *
@@ -0,0 +1,65 @@
+from array import array
+
+
+class Record:
+    """A fixed-field sample backed by an array('f').
+
+    Subclasses list their field names in FIELDS. Fields can be read as
+    attributes (rec.pm10_mass) or by name or index (rec['pm10_mass'],
+    rec[3]), and drivers fill values in place so a sample costs no
+    allocations once the record exists.
+    """
+    FIELDS = ()
+
+    def __init__(self):
+        self.values = array('f', [0.0] * len(self.FIELDS))
+        self.timestamp = 0
+
+    def __getattr__(self, name):
+        try:
+            return self.values[self.FIELDS.index(name)]
+        except ValueError:
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self.FIELDS.index(key)
+        return self.values[key]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, str):
+            key = self.FIELDS.index(key)
+        self.values[key] = value
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def as_dict(self):
+        """Return all fields and the timestamp as a new dict."""
+        d = {'timestamp': self.timestamp}
+        for i, name in enumerate(self.FIELDS):
+            d[name] = self.values[i]
+        return d
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.as_dict())
+
+
+class Ring:
+    """A fixed set of preallocated records used round-robin.
+
+    A driver fills next() in place while consumers may still hold the
+    previous records, so a record stays valid until `size` newer samples
+    have been taken.
+    """
+
+    def __init__(self, cls, size=4):
+        self._records = [cls() for i in range(size)]
+        self._i = 0
+
+    def current(self):
+        return self._records[self._i]
+
+    def next(self):
+        self._i = (self._i + 1) % len(self._records)
+        return self._records[self._i]
@@ -0,0 +1 @@
+from sensirion.core import *
@@ -0,0 +1,156 @@
+"""
+Transport shared by the Sensirion drivers. Data is sent and received as
+16 bit big endian words, each followed by a CRC-8 (polynomial 0x31, init
+0xFF). See the "Checksum Calculation" section of any of the datasheets.
+"""
+
+def _make_table():
+    t = bytearray(256)
+    for i in range(256):
+        crc = i
+        for bit in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        t[i] = crc
+    return bytes(t)
+
+CRC_TABLE = _make_table()
+
+def crc8(data, i=0):
+    """Return the CRC of the word at data[i:i+2]."""
+    t = CRC_TABLE
+    return t[t[0xFF ^ data[i]] ^ data[i+1]]
+
+def check_frame(buf, n=-1):
+    """Check the CRCs of all words in the first n bytes (all if n < 0) of a
+    received frame in one pass."""
+    t = CRC_TABLE
+    if n < 0:
+        n = len(buf)
+    for i in range(0, n, 3):
+        if t[t[0xFF ^ buf[i]] ^ buf[i+1]] != buf[i+2]:
+            return False
+    return True
+
+def compact(buf, n=-1):
+    """Check the CRCs of the first n bytes (all if n < 0) of a received frame
+    and move the data words to the front of buf, in place. Returns the data
+    length or -1 on a CRC error."""
+    t = CRC_TABLE
+    if n < 0:
+        n = len(buf)
+    j = 0
+    for i in range(0, n, 3):
+        a = buf[i]
+        b = buf[i+1]
+        if t[t[0xFF ^ a] ^ b] != buf[i+2]:
+            return -1
+        buf[j] = a
+        buf[j+1] = b
+        j += 2
+    return j
+
+def pack_words(data):
+    """Return the bytes of data (even length) with a CRC after every word."""
+    out = bytearray(len(data) // 2 * 3)
+    for i in range(0, len(data), 2):
+        j = i // 2 * 3
+        out[j] = data[i]
+        out[j+1] = data[i+1]
+        out[j+2] = crc8(data, i)
+    return out
+
+def payload(frame, n=-1):
+    """Return the data of a received frame without the CRC bytes."""
+    if n < 0:
+        n = len(frame)
+    out = bytearray(n // 3 * 2)
+    for i in range(0, n, 3):
+        j = i // 3 * 2
+        out[j] = frame[i]
+        out[j+1] = frame[i+1]
+    return out
+
+class Sensirion:
+    """Base class of the Sensirion drivers.
+
+    Subclasses set ADDRESS and describe their commands in COMMANDS as
+    name: (command code, delay in ms after sending it, words to read).
+    Frames are received into one preallocated buffer per driver, a
+    memoryview of the right length for each command is made up front.
+    :param i2c: The `I2CBus` to use.
+    """
+    ADDRESS = 0
+    COMMANDS = {}
+
+    def __init__(self, i2c):
+        self._i2c = i2c
+        self._status = ('ok', '')
+        size = 0
+        for c in self.COMMANDS.values():
+            size = max(size, 3 * c[2])
+        self._buf = bytearray(size)
+        buf = memoryview(self._buf)
+        self._frames = {}
+        for name, c in self.COMMANDS.items():
+            if c[2]:
+                self._frames[name] = buf[:3 * c[2]]
+
+    @property
+    def status(self):
+        """Returns true if everything is ok."""
+        return self._status
+
+    async def _send(self, name, data=b''):
+        """Send a command with optional argument data (CRCs are added)."""
+        code, delay, n = self.COMMANDS[name]
+        if data:
+            code = code + pack_words(data)
+        await self._write(code, delay)
+
+    async def _write(self, code, delay=0):
+        """Send a command not in COMMANDS (e.g. one built at runtime)."""
+        try:
+            await self._i2c.write(self.ADDRESS, code, delay)
+            self._status = ('ok', '')
+        except:
+            self._status = ('error', 'can\'t write to i2c')
+
+    async def _receive(self, name):
+        # Read the response of a command into its view of self._buf
+        code, delay, n = self.COMMANDS[name]
+        frame = self._frames[name]
+        try:
+            await self._i2c.read_into(self.ADDRESS, code, frame, delay)
+        except:
+            self._status = ('error', 'can\'t write to i2c')
+            return None
+        return frame
+
+    async def _read(self, name):
+        """Send a command and return the received frame (CRCs checked) or
+        None on error. The frame is a view of the driver's buffer, valid
+        until the next command."""
+        frame = await self._receive(name)
+        if frame is None:
+            return None
+        if not check_frame(frame):
+            self._status = ('error', 'crc error in ' + name)
+            return None
+        self._status = ('ok', '')
+        return frame
+
+    async def _read_data(self, name):
+        """Send a command and return the data of the response without the
+        CRC bytes, compacted in place to the front of the driver's buffer,
+        or None on error."""
+        frame = await self._receive(name)
+        if frame is None:
+            return None
+        if compact(frame) < 0:
+            self._status = ('error', 'crc error in ' + name)
+            return None
+        self._status = ('ok', '')
+        return self._buf
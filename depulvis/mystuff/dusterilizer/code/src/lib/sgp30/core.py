@@ -4,35 +4,65 @@ Reading format. See https://www.rutronik.com/fileadmin/Rutronik/Supplier/Sensiri
 
 import ustruct as struct
 import time
+from record import Record, Ring
+from sensirion import Sensirion, pack_words, check_frame
 
-class SGP30:
-    """A driver for the SHTC1 humidity and temerature sensor.
-    :param i2c: The `I2C` object to use.
+class AQData(Record):
+    """One SGP30 air quality reading."""
+    FIELDS = ('eco2', 'tvoc')
+
+# How long a stored baseline stays valid while the sensor is off
+BASELINE_MAX_AGE_S = 7 * 24 * 3600
+
+class SGP30(Sensirion):
+    """A driver for the SGP30 air quality sensor.
+
+    The sensor learns its baseline over hours. init() restores one saved by
+    save_baseline() so readings are usable right after a restart.
+    :param i2c: The `I2CBus` to use.
+    :param records: Number of preallocated `AQData` records to cycle through.
     """
     ADDRESS=0x58
     I2C_WRITE_DELAY_MS=20
-    def __init__(self, i2c):
-        self._i2c = i2c
-        self._tvoc = 0.0
-        self._baseline_tvoc = 0.0
-        self._eco2 = 0.0
-        self._baseline_eco2 = 0.0
-        self._status = ('ok', '')
+    COMMANDS = {
+        'init_air_quality':        (b'\x20\x03', I2C_WRITE_DELAY_MS, 0),
+        'measure_air_quality':     (b'\x20\x08', I2C_WRITE_DELAY_MS, 2),
+        'get_baseline':            (b'\x20\x15', I2C_WRITE_DELAY_MS, 2),
+        'set_baseline':            (b'\x20\x1e', I2C_WRITE_DELAY_MS, 0),
+        'set_humidity':            (b'\x20\x61', I2C_WRITE_DELAY_MS, 0),
+        'measure_test':            (b'\x20\x32', I2C_WRITE_DELAY_MS, 1),
+        'get_feature_set_version': (b'\x20\x2f', I2C_WRITE_DELAY_MS, 1),
+        'measure_signals':         (b'\x20\x50', I2C_WRITE_DELAY_MS, 2),
+        'get_serial_id':           (b'\x36\x82', I2C_WRITE_DELAY_MS, 3),
+    }
+    def __init__(self, i2c, records=4):
+        super().__init__(i2c)
+        self._ring = Ring(AQData, records)
+        self._data = self._ring.current()
+        self._baseline_tvoc = 0
+        self._baseline_eco2 = 0
+        self._baseline_restored = False
+        self._humidity = 0
+
+    @property
+    def data(self):
+        """Return the latest reading as `AQData` record (no copy)."""
+        return self._data
 
     @property
     def tvoc(self):
         """Returns Total Volatile Organic Compound in parts per billion."""
-        return self._tvoc
+        return self._data.tvoc
 
     @property
     def baseline_tvoc(self):
         """Returns Total Volatile Organic Compound baseline value."""
-        return self._temperature
+        return self._baseline_tvoc
 
     @property
     def eco2(self):
         """Returns Carbon Dioxide Equivalent in parts per million."""
-        return self._eco2
+        return self._data.eco2
 
     @property
     def baseline_eco2(self):
@@ -40,102 +70,111 @@ class SGP30:
         return self._baseline_eco2
 
     @property
-    def status(self):
-        """Returns true if everything is ok."""
-        return self._status
-
-    def _write_i2c(self, data):
-        try:
-            self._i2c.writeto(self.ADDRESS, data)
-            time.sleep_ms(self.I2C_WRITE_DELAY_MS)
-            self._status = ('ok', '')
-        except:
-            self._status = ('error', 'can\'t write to i2c')
-
-    def _read_i2c(self, cmd, num):
-        try:
-            self._i2c.writeto(self.ADDRESS, cmd)
-            time.sleep_ms(self.I2C_WRITE_DELAY_MS)
-            self._status = ('ok', '')
-            return self._i2c.readfrom(self.ADDRESS, num)
-        except:
-            self._status = ('error', 'can\'t write to i2c')
-            return None
-
-    def _calc_int(self, b):
-        struct_int = struct.pack('>BB', b[0], b[1])
-        int_values = struct.unpack('>H', struct_int)
-        crc = self._calc_crc(b[0:2])
-        if crc == bytes([b[2]]):
-            return int_values[0]
-        else:
-            print('crc error: ' + str(crc) + '=' + str(bytes([b[2]])))
-            return None
-
-    def _calc_crc(self, data):
-        crc = 0xFF
-        for i in range(2):
-            crc = (crc ^ data[i]) & 0xFF
-            for bit in range(8, 0, -1):
-                if crc & 0x80:
-                    crc = ((crc << 1) ^ 0x31) & 0xFF
-                else:
-                    crc = ((crc << 1)) & 0xFF
-        return bytes([crc])
-
-    def init(self):
-        self.init_air_quality()
+    def baseline_restored(self):
+        """Return if init() restored a saved baseline."""
+        return self._baseline_restored
+
+    async def init(self, baseline_file=None):
+        """Start the measurement and restore the baseline from
+        baseline_file if it holds a valid one."""
+        await self.init_air_quality()
+        self._baseline_restored = False
+        if baseline_file is not None:
+            baseline = load_baseline(baseline_file)
+            if baseline is not None:
+                await self.set_baseline(*baseline)
+                self._baseline_restored = self._status[0] == 'ok'
         return True
 
-    def read_measured_values(self):
-        self.init_air_quality()
-        self.measure_air_quality()
-
-    def init_air_quality(self):
-        cmd = b'\x20\x03'
-        self._write_i2c(cmd)
-
-    def measure_air_quality(self):
-        cmd = b'\x20\x08'
-        data = self._read_i2c(cmd, 6)
-        eco2 = self._eco2
-        tvoc = self._tvoc
-        try:
-            eco2 = self._calc_int(data[0:3])
-            tvoc = self._calc_int(data[3:6])
-            self._status = ('ok', '')
-        except Exception as e:
-            self._status = ('error', e)
-
-        if eco2:
-            self._eco2 = eco2
-        if tvoc:
-            self._tvoc = tvoc
-        if self._eco2 < 400 or self._eco2 > 60000 or self._tvoc < 0 or self._tvoc > 60000:
-            self._status = ('error', 'eco2/tvoc is out of range')
+    async def read_measured_values(self):
+        # init_air_quality() would restart the baseline algorithm, only
+        # call it once in init()
+        await self.measure_air_quality()
+
+    async def init_air_quality(self):
+        await self._send('init_air_quality')
+
+    async def measure_air_quality(self):
+        frame = await self._read('measure_air_quality')
+        prev = self._data
+        rec = self._ring.next()
+        if frame is None:
+            # a frame with a bad CRC keeps the previous values
+            rec.values[0] = prev.values[0]
+            rec.values[1] = prev.values[1]
         else:
-            self._status = ('ok', '')
-
-    def get_baseline(self):
-        cmd = b'\x20\x15'
-        self._read_i2c(cmd, 6)
-
-    def set_baseline(self, baseline):
-        cmd = b'\x20\x1e'
-        self._write_i2c(cmd + baseline)
-
-    def measure_test(self):
-        cmd = b'\x20\x32'
-        data = self._read_i2c(cmd, 3)
-
-    def get_feature_set_version(self):
-        cmd = b'\x20\x2f'
-        data = self._read_i2c(cmd, 3)
-
-    def measure_signals(self):
-        cmd = b'\x20\x50'
-        data = self._read_i2c(cmd, 6)
+            rec.values[0] = frame[0] << 8 | frame[1]
+            rec.values[1] = frame[3] << 8 | frame[4]
+        rec.timestamp = time.time()
+        self._data = rec
+        if self._status[0] == 'error':
+            return
+        if rec.eco2 < 400 or rec.eco2 > 60000 or rec.tvoc < 0 or rec.tvoc > 60000:
+            self._status = ('error', 'eco2/tvoc is out of range')
 
-    def get_serial_id(self):
-        cmd = b'\x36\x82'
-        data = self._read_i2c(cmd, 9)
+    async def get_baseline(self):
+        """Read the current baseline, returns (eco2, tvoc) or None on error."""
+        frame = await self._read('get_baseline')
+        if frame is None:
+            return None
+        self._baseline_eco2 = frame[0] << 8 | frame[1]
+        self._baseline_tvoc = frame[3] << 8 | frame[4]
+        return self._baseline_eco2, self._baseline_tvoc
+
+    async def set_baseline(self, eco2, tvoc):
+        # the sensor expects the values in reverse order of get_baseline
+        await self._send('set_baseline', struct.pack('>HH', tvoc, eco2))
+        if self._status[0] == 'ok':
+            self._baseline_eco2 = eco2
+            self._baseline_tvoc = tvoc
+
+    def save_baseline(self, path):
+        """Store the baseline last read by get_baseline() in path."""
+        save_baseline(path, self._baseline_eco2, self._baseline_tvoc)
+
+    async def set_humidity(self, absolute_humidity):
+        """Compensate the readings for absolute_humidity in g/m^3, 0 turns
+        the compensation off. Only sent to the sensor when it changed."""
+        value = min(int(absolute_humidity * 256 + 0.5), 0xFFFF)
+        if value != self._humidity:
+            await self._send('set_humidity', struct.pack('>H', value))
+            if self._status[0] == 'ok':
+                self._humidity = value
+
+    async def measure_test(self):
+        await self._read('measure_test')
+
+    async def get_feature_set_version(self):
+        await self._read('get_feature_set_version')
+
+    async def measure_signals(self):
+        await self._read('measure_signals')
+
+    async def get_serial_id(self):
+        await self._read('get_serial_id')
+
+
+def save_baseline(path, eco2, tvoc):
+    """Write a baseline record: eco2, tvoc and the time it was saved as
+    16 bit words with a CRC each, like on the wire (12 bytes)."""
+    with open(path, 'wb') as f:
+        f.write(pack_words(struct.pack('>HHI', eco2, tvoc, int(time.time()))))
+
+def load_baseline(path):
+    """Return the (eco2, tvoc) baseline stored in path or None if there is
+    none, it is corrupt or too old."""
+    try:
+        with open(path, 'rb') as f:
+            frame = f.read(12)
+    except OSError:
+        return None
+    if len(frame) != 12 or not check_frame(frame):
+        return None
+    eco2 = frame[0] << 8 | frame[1]
+    tvoc = frame[3] << 8 | frame[4]
+    saved = frame[6] << 24 | frame[7] << 16 | frame[9] << 8 | frame[10]
+    # without a synced clock the age is unknown, trust the record then
+    now = time.time()
+    if saved <= now and now - saved > BASELINE_MAX_AGE_S:
+        return None
+    return eco2, tvoc
@@ -4,112 +4,149 @@ Reading format. See https://www.sensirion.com/fileadmin/user_upload/customers/se
 
 import ustruct as struct
 import time
+from math import exp
+from record import Record, Ring
+from sensirion import Sensirion
 
-class SHT31:
+class HTData(Record):
+    """One SHT31 reading."""
+    FIELDS = ('humidity', 'temperature')
+
+    def absolute_humidity(self):
+        """Return the absolute humidity in g/m^3 (Magnus formula)."""
+        t = self.values[1]
+        return 216.7 * (self.values[0] / 100 * 6.112 * exp(17.62 * t / (243.12 + t))) / (273.15 + t)
+
+REPEATABILITY = ('high', 'medium', 'low')
+
+class SHT31(Sensirion):
     """A driver for the SHT31 humidity and temerature sensor.
-    :param i2c: The `I2C` object to use.
+
+    By default every read_measured_values() triggers a single shot
+    conversion and waits for it with the bus released. After
+    start_periodic() the sensor converts on its own and reads just fetch
+    the latest result.
+    :param i2c: The `I2CBus` to use.
+    :param records: Number of preallocated `HTData` records to cycle through.
+    :param repeatability: 'high', 'medium' or 'low'.
     """
     ADDRESS=0x44
     I2C_WRITE_DELAY_MS=20
-    def __init__(self, i2c):
-        self._i2c = i2c
-        self._humidity = 0.0
-        self._temperature = 0.0
-        self._status = ('ok', '')
+    COMMANDS = {
+        # single shot without clock stretching, delay is the conversion time
+        'single_shot_high':   (b'\x24\x00', 16, 2),
+        'single_shot_medium': (b'\x24\x0b', 7, 2),
+        'single_shot_low':    (b'\x24\x16', 5, 2),
+        'fetch_data':         (b'\xe0\x00', 0, 2),
+        'stop_periodic':      (b'\x30\x93', 1, 0),
+        'read_status':        (b'\xf3\x2d', 1, 1),
+        'reset':              (b'\x30\xa2', 2, 0),
+    }
+    # periodic acquisition commands by measurements per second, for high,
+    # medium and low repeatability
+    PERIODIC = {
+        0.5: (b'\x20\x32', b'\x20\x24', b'\x20\x2f'),
+        1:   (b'\x21\x30', b'\x21\x26', b'\x21\x2d'),
+        2:   (b'\x22\x36', b'\x22\x20', b'\x22\x2b'),
+        4:   (b'\x23\x34', b'\x23\x22', b'\x23\x29'),
+        10:  (b'\x27\x37', b'\x27\x21', b'\x27\x2a'),
+    }
+    def __init__(self, i2c, records=4, repeatability='high'):
+        super().__init__(i2c)
+        self._ring = Ring(HTData, records)
+        self._data = self._ring.current()
+        self._mps = 0
+        self.set_repeatability(repeatability)
+
+    @property
+    def data(self):
+        """Return the latest reading as `HTData` record (no copy)."""
+        return self._data
 
     @property
     def humidity(self):
         """Return the Humidity, in %RH."""
-        return self._humidity
+        return self._data.humidity
 
     @property
     def temperature(self):
         """Return the Temperature, in °C."""
-        return self._temperature
+        return self._data.temperature
 
     @property
-    def status(self):
-        """Returns true if everything is ok."""
-        return self._status
-
-    def _write_i2c(self, data):
-        try:
-            self._i2c.writeto(self.ADDRESS, data)
-            time.sleep_ms(self.I2C_WRITE_DELAY_MS)
-            self._status = ('ok', '')
-        except:
-            self._status = ('error', 'can\'t write to i2c')
-
-    def _read_i2c(self, cmd, num):
-        try:
-            self._i2c.writeto(self.ADDRESS, cmd)
-            time.sleep_ms(self.I2C_WRITE_DELAY_MS)
-            self._status = ('ok', '')
-            return self._i2c.readfrom(self.ADDRESS, num)
-        except:
-            self._status = ('error', 'can\'t write to i2c')
-            return None
-
-    def _calc_int(self, b):
-        struct_int = struct.pack('>BB', b[0], b[1])
-        int_values = struct.unpack('>H', struct_int)
-        crc = self._calc_crc(b[0:2])
-        if crc == bytes([b[2]]):
-            return int_values[0]
-        else:
-            print('crc error: ' + str(crc) + '=' + str(bytes([b[2]])))
-            return None
+    def absolute_humidity(self):
+        """Return the absolute humidity, in g/m^3."""
+        return self._data.absolute_humidity()
 
-    def _calc_crc(self, data):
-        crc = 0xFF
-        for i in range(2):
-            crc = (crc ^ data[i]) & 0xFF
-            for bit in range(8, 0, -1):
-                if crc & 0x80:
-                    crc = ((crc << 1) ^ 0x31) & 0xFF
-                else:
-                    crc = ((crc << 1)) & 0xFF
-        return bytes([crc])
+    async def init(self):
 
-    def init(self):
+        await self.read_measured_values()
+        return self.humidity > 0
 
-        self.read_measured_values()
-        return self._humidity > 0
+    @property
+    def periodic(self):
+        """Return the periodic measurements per second, 0 in single shot mode."""
+        return self._mps
+
+    def set_repeatability(self, repeatability):
+        """Select the repeatability of the following single shot reads or
+        the next start_periodic()."""
+        if repeatability not in REPEATABILITY:
+            raise ValueError(repeatability)
+        self._repeatability = repeatability
+        self._single_shot = 'single_shot_' + repeatability
 
     def set_high_repeatability_no_stretching(self):
-        cmd = b'\x24\x00'
-
-    def read_measured_values(self):
-        cmd = b'\x5c\x24'
-        data = self._read_i2c(cmd, 6)
-        humidity = self._humidity
-        temperature = self._temperature
-        try:
-            humidity = self._calc_int(data[0:3])
-            temperature = self._calc_int(data[3:6])
-            self._status = ('ok', '')
-        except Exception as e:
-            self._status = ('error', e)
-
-        if humidity:
-            self._humidity = 100 * humidity / (65535.0)
-        if temperature:
-            self._temperature = -45 + 175 * temperature / (65535.0)
-        if self._temperature < -30 or self._temperature > 100 or self._humidity < 0 or self._humidity > 100:
-            self._status = ('error', 'Temperature/Humidity is out of range')
+        self.set_repeatability('high')
+
+    async def start_periodic(self, mps=1, repeatability=None):
+        """Start periodic acquisition with mps (0.5, 1, 2, 4 or 10)
+        measurements per second. Returns once the first one is available.
+        Read at most mps times per second, the sensor doesn't answer a
+        fetch without a new result."""
+        codes = self.PERIODIC.get(mps)
+        if codes is None:
+            raise ValueError(mps)
+        if repeatability is not None:
+            self.set_repeatability(repeatability)
+        if self._mps:
+            await self.stop_periodic()
+        await self._write(codes[REPEATABILITY.index(self._repeatability)], int(1000 / mps) + 1)
+        if self._status[0] == 'ok':
+            self._mps = mps
+
+    async def stop_periodic(self):
+        """Return to single shot mode."""
+        await self._send('stop_periodic')
+        self._mps = 0
+
+    async def read_measured_values(self):
+        frame = await self._read('fetch_data' if self._mps else self._single_shot)
+        prev = self._data
+        rec = self._ring.next()
+        if frame is None:
+            # a frame with a bad CRC keeps the previous values
+            rec.values[0] = prev.values[0]
+            rec.values[1] = prev.values[1]
         else:
-            self._status = ('ok', '')
-
-    def read_id_register(self):
-        cmd = b'\xef\xc8'
-        data = self._read_i2c(cmd, 3)
-        try:
-            self._status = ('ok', '')
-            if self._calc_crc(data) == bytes([data[2]]):
-                return data[0:2]
-        except Exception as e:
-            self._status = ('error', e)
-
-    def reset(self):
-        cmd = b'\x80\x5d'
-        self._write_i2c(cmd)
+            rec.values[0] = 100 * (frame[3] << 8 | frame[4]) / 65535.0
+            rec.values[1] = -45 + 175 * (frame[0] << 8 | frame[1]) / 65535.0
+        rec.timestamp = time.time()
+        self._data = rec
+        if self._status[0] == 'error':
+            return
+        if rec.temperature < -30 or rec.temperature > 100 or rec.humidity < 0 or rec.humidity > 100:
+            self._status = ('error', 'Temperature/Humidity is out of range')
+
+    async def read_status(self):
+        """Return the 16 bit status register or None on error. Only in
+        single shot mode, periodic acquisition answers fetches alone."""
+        frame = await self._read('read_status')
+        if frame is not None:
+            return frame[0] << 8 | frame[1]
+
+    async def reset(self):
+        """Soft reset, back in single shot mode."""
+        if self._mps:
+            await self.stop_periodic()
+        await self._send('reset')
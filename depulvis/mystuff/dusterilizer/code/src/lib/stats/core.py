@@ -0,0 +1,210 @@
+from array import array
+from collections.deque import deque
+
+
+class Rolling:
+    """Statistics over the last size values of one metric.
+
+    update() is O(1) (amortized for min and max, which are kept in
+    monotonic deques of sample numbers), mean, min, max and ewma are O(1)
+    to read. Percentiles come from a histogram of the window with `bins`
+    equal bins between lo and hi (values outside count in the edge bins),
+    so they are approximate and cost O(bins).
+    """
+
+    def __init__(self, size=16, alpha=0.2, lo=0.0, hi=1000.0, bins=32):
+        self.size = size
+        self.alpha = alpha
+        self._buf = array('f', [0.0] * size)
+        self._n = 0      # values in the window
+        self._count = 0  # values seen, the sample number of the next one
+        self._sum = 0.0
+        self._ewma = 0.0
+        self._mins = deque(maxlen=size)
+        self._maxs = deque(maxlen=size)
+        self._lo = lo
+        self._width = (hi - lo) / bins
+        self._hist = array('H', [0] * bins)
+
+    def _bin(self, x):
+        b = int((x - self._lo) / self._width)
+        return 0 if b < 0 else min(b, len(self._hist) - 1)
+
+    def update(self, x):
+        buf = self._buf
+        size = self.size
+        i = self._count % size
+        if self._n == size:
+            # the oldest value leaves the window
+            old = self._count - size
+            self._sum -= buf[i]
+            self._hist[self._bin(buf[i])] -= 1
+            if self._mins[0] == old:
+                self._mins.popleft()
+            if self._maxs[0] == old:
+                self._maxs.popleft()
+        else:
+            self._n += 1
+        buf[i] = x
+        # go on with the stored float32, the value that later leaves the
+        # window, so it is taken out of the same bin it went into
+        x = buf[i]
+        self._hist[self._bin(x)] += 1
+        mins = self._mins
+        while mins and buf[mins[-1] % size] >= x:
+            mins.pop()
+        mins.append(self._count)
+        maxs = self._maxs
+        while maxs and buf[maxs[-1] % size] <= x:
+            maxs.pop()
+        maxs.append(self._count)
+        self._ewma = x if not self._count else self._ewma + self.alpha * (x - self._ewma)
+        self._count += 1
+        if i == size - 1:
+            # resum once per window so rounding errors don't pile up
+            s = 0.0
+            for v in buf:
+                s += v
+            self._sum = s
+        else:
+            self._sum += x
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def last(self):
+        return self._buf[(self._count - 1) % self.size] if self._n else 0.0
+
+    @property
+    def mean(self):
+        return self._sum / self._n if self._n else 0.0
+
+    @property
+    def min(self):
+        return self._buf[self._mins[0] % self.size] if self._n else 0.0
+
+    @property
+    def max(self):
+        return self._buf[self._maxs[0] % self.size] if self._n else 0.0
+
+    @property
+    def ewma(self):
+        return self._ewma
+
+    def percentile(self, p):
+        """Return the approximate p-th percentile (0 to 100) of the window."""
+        n = self._n
+        if not n:
+            return 0.0
+        target = p * n / 100
+        seen = 0
+        for b, c in enumerate(self._hist):
+            if c and seen + c >= target:
+                # interpolate inside the bin, the exact extremes bound it
+                x = self._lo + (b + (target - seen) / c) * self._width
+                return min(max(x, self.min), self.max)
+            seen += c
+        return self.max
+
+    def median(self):
+        return self.percentile(50)
+
+
+class Stats:
+    """Rolling statistics for the fields of a `Record` type, e.g. the
+    fused frames. One instance can be shared by all tasks: the owner calls
+    update() with every record, others just read.
+    :param cls: The `Record` subclass.
+    :param fields: Names of the fields to track, all by default.
+    :param ranges: Maps field names to the (lo, hi) of their percentile
+                   histogram, (0, 1000) otherwise.
+    The other arguments are passed to every `Rolling`.
+    """
+
+    def __init__(self, cls, fields=None, size=16, alpha=0.2, ranges=None, bins=32):
+        if fields is None:
+            fields = cls.FIELDS
+        if ranges is None:
+            ranges = {}
+        self._metrics = {}
+        self._index = []
+        for name in fields:
+            lo, hi = ranges.get(name, (0.0, 1000.0))
+            metric = Rolling(size, alpha, lo, hi, bins)
+            self._metrics[name] = metric
+            self._index.append((cls.FIELDS.index(name), metric))
+
+    def update(self, rec):
+        values = rec.values
+        for i, metric in self._index:
+            metric.update(values[i])
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def __contains__(self, name):
+        return name in self._metrics
+
+
+class Aggregate:
+    """min, mean, max and last of the fields of a `Record` type over the
+    records passed to update() since the last reset(), for downsampling.
+    The mean is kept as a running mean in Python floats: a float32 sum of
+    eCO2 or TVOC values (up to 60000) over a long window would lose whole
+    units.
+    :param cls: The `Record` subclass.
+    :param fields: Names of the fields to aggregate, all by default.
+    """
+
+    def __init__(self, cls, fields=None):
+        if fields is None:
+            fields = cls.FIELDS
+        self.fields = tuple(fields)
+        self._index = [cls.FIELDS.index(name) for name in self.fields]
+        n = len(self.fields)
+        self.min = array('f', [0.0] * n)
+        self.max = array('f', [0.0] * n)
+        self.last = array('f', [0.0] * n)
+        self._mean = [0.0] * n
+        self.n = 0
+        self.start = 0
+        self.timestamp = 0
+
+    def reset(self):
+        self.n = 0
+        for j in range(len(self.fields)):
+            self.min[j] = self.max[j] = self.last[j] = self._mean[j] = 0.0
+
+    def update(self, rec):
+        values = rec.values
+        first = not self.n
+        if first:
+            self.start = rec.timestamp
+        for j, i in enumerate(self._index):
+            x = values[i]
+            if first:
+                self.min[j] = self.max[j] = self._mean[j] = x
+            else:
+                if x < self.min[j]:
+                    self.min[j] = x
+                if x > self.max[j]:
+                    self.max[j] = x
+                self._mean[j] += (x - self._mean[j]) / (self.n + 1)
+            self.last[j] = x
+        self.timestamp = rec.timestamp
+        self.n += 1
+
+    def mean(self, j):
+        return self._mean[j]
+
+    def as_dict(self):
+        """Return a new dict with [min, mean, max, last] per field, the
+        window's first and last timestamp and the number of records."""
+        d = {'start': self.start, 'timestamp': self.timestamp, 'n': self.n}
+        for j, name in enumerate(self.fields):
+            d[name] = [self.min[j], self.mean(j), self.max[j], self.last[j]]
+        return d
+
+    def __repr__(self):
+        return 'Aggregate({})'.format(self.as_dict())
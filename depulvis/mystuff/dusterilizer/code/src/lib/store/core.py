@@ -0,0 +1,183 @@
+import os
+import ustruct as struct
+
+
+class RingStore:
+    """A persistent ring buffer of fixed size records on the filesystem.
+
+    Records are struct packed (little endian, fmt without the byte order
+    character) behind a 32 bit sequence number starting at 1. They live in
+    `segments` files of `segment_records` records each, created full size
+    up front so the store never grows. Record seq always goes to slot
+    (seq - 1) mod capacity, so every slot is rewritten once per round and
+    wear is spread evenly. Appends are collected in RAM and written
+    flush_every at a time, one write per batch. Reading streams one record
+    at a time, RAM use doesn't depend on the size of the store.
+
+    On open the newest record is found from the first record of every
+    segment and a scan of the newest segment.
+    :param path: Directory of the segment files, created if missing.
+    :param fmt: struct format of the records, e.g. 'I14f'.
+    """
+
+    def __init__(self, path, fmt, segment_records=256, segments=8, flush_every=8):
+        self.fmt = '<I' + fmt
+        self.size = struct.calcsize(self.fmt)
+        self.path = path
+        self.segment_records = segment_records
+        self.segments = segments
+        self.capacity = segment_records * segments
+        self._flush_every = min(flush_every, segment_records)
+        self._wbuf = bytearray(self.size * self._flush_every)
+        self._pending = 0
+        self._rbuf = bytearray(self.size)
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass
+        for i in range(segments):
+            self._preallocate(self._segment(i))
+        self._next = self._recover()
+
+    def _segment(self, i):
+        return '{}/{}.seg'.format(self.path, i)
+
+    def _preallocate(self, name):
+        length = self.segment_records * self.size
+        try:
+            if os.stat(name)[6] == length:
+                return
+        except OSError:
+            pass
+        # self._wbuf is still all zeros, seq 0 marks an empty slot
+        with open(name, 'wb') as f:
+            while length > 0:
+                n = min(length, len(self._wbuf))
+                f.write(memoryview(self._wbuf)[:n])
+                length -= n
+
+    def _seq_at(self, f, k):
+        f.seek(k * self.size)
+        f.readinto(self._rbuf)
+        return struct.unpack_from('<I', self._rbuf)[0]
+
+    def _recover(self):
+        # the segment whose first record is the newest holds the head
+        newest = 0
+        seg = 0
+        for i in range(self.segments):
+            with open(self._segment(i), 'rb') as f:
+                seq = self._seq_at(f, 0)
+            if seq > newest:
+                newest = seq
+                seg = i
+        if not newest:
+            return 1
+        with open(self._segment(seg), 'rb') as f:
+            for k in range(1, self.segment_records):
+                seq = self._seq_at(f, k)
+                if seq != newest + 1:
+                    break
+                newest = seq
+        return newest + 1
+
+    @property
+    def next_seq(self):
+        """Sequence number the next append gets."""
+        return self._next + self._pending
+
+    @property
+    def first_seq(self):
+        """Sequence number of the oldest record still stored."""
+        return max(1, self.next_seq - self.capacity)
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def append(self, *values):
+        """Store a record, returns its sequence number. It is written to
+        flash with the next flush, at the latest after flush_every appends."""
+        seq = self.next_seq
+        struct.pack_into(self.fmt, self._wbuf, self._pending * self.size, seq, *values)
+        self._pending += 1
+        # a batch never spans two segments
+        if self._pending == self._flush_every or seq % self.segment_records == 0:
+            self.flush()
+        return seq
+
+    def flush(self):
+        n = self._pending
+        if not n:
+            return
+        slot = (self._next - 1) % self.capacity
+        with open(self._segment(slot // self.segment_records), 'r+b') as f:
+            f.seek(slot % self.segment_records * self.size)
+            f.write(memoryview(self._wbuf)[:n * self.size])
+        self._next += n
+        self._pending = 0
+
+    def read(self, seq=None):
+        """Yield the stored records from seq (the oldest by default) on as
+        tuples (seq, values...), in order."""
+        self.flush()
+        if seq is None or seq < self.first_seq:
+            seq = self.first_seq
+        end = self._next
+        buf = self._rbuf
+        f = None
+        cur = -1
+        try:
+            while seq < end:
+                slot = (seq - 1) % self.capacity
+                seg = slot // self.segment_records
+                if seg != cur:
+                    if f is not None:
+                        f.close()
+                    f = open(self._segment(seg), 'rb')
+                    f.seek(slot % self.segment_records * self.size)
+                    cur = seg
+                elif slot % self.segment_records == 0:
+                    # wrapped around within the only segment
+                    f.seek(0)
+                f.readinto(buf)
+                rec = struct.unpack_from(self.fmt, buf)
+                if rec[0] != seq:
+                    # overwritten while reading
+                    break
+                yield rec
+                seq += 1
+        finally:
+            if f is not None:
+                f.close()
+
+    def get(self, seq):
+        """Return the record seq as tuple (seq, values...) or None if it
+        isn't stored (anymore)."""
+        if not self.first_seq <= seq < self.next_seq:
+            return None
+        if seq >= self._next:
+            self.flush()
+        slot = (seq - 1) % self.capacity
+        with open(self._segment(slot // self.segment_records), 'rb') as f:
+            f.seek(slot % self.segment_records * self.size)
+            f.readinto(self._rbuf)
+        return struct.unpack_from(self.fmt, self._rbuf)
+
+    def range(self, start, stop, field=1):
+        """Yield the records whose field (the first value after seq by
+        default, e.g. a timestamp) is in [start, stop). Records have to be
+        appended in order of that field, the first one is found by a
+        binary search."""
+        self.flush()
+        lo = self.first_seq
+        hi = self._next
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get(mid)[field] < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        for rec in self.read(lo):
+            if rec[field] >= stop:
+                return
+            yield rec
@@ -0,0 +1 @@
+from telemetry.core import *
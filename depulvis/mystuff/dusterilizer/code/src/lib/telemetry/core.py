@@ -0,0 +1,183 @@
+import ustruct as struct
+import utime
+
+try:
+    # MicroPython 1.21 on
+    import deflate
+    import io
+
+    def _compress(data):
+        out = io.BytesIO()
+        with deflate.DeflateIO(out, deflate.ZLIB) as f:
+            f.write(data)
+        return out.getvalue()
+except ImportError:
+    try:
+        from zlib import compress as _compress
+    except ImportError:
+        _compress = None
+
+# Binary payload layout, little endian. Bump VERSION whenever it or the
+# field table changes and teach host/telemetry.py the new one.
+#
+#   header   B version, B kind, I seq
+#   FRAME    I timestamp, I field mask, f per field
+#   SUMMARY  I timestamp, I start, H n, I field mask,
+#            4f (min, mean, max, last) per field
+#   ALARM    B 1 on / 0 off
+#   BATCH    B version, B kind, H count, then count times H length and
+#            a payload of any format. With DEFLATED set in kind the part
+#            after the header is zlib compressed.
+#
+# Bit i of the field mask stands for fields[i] of the encoder's table,
+# values follow in table order.
+VERSION = 1
+FRAME = 0
+SUMMARY = 1
+ALARM = 2
+BATCH = 3
+DEFLATED = 0x80
+
+_FRAME = '<BBIII'
+_SUMMARY = '<BBIIIHI'
+_ALARM = '<BBIB'
+_BATCH = '<BBH'
+_FRAME_SIZE = struct.calcsize(_FRAME)
+_SUMMARY_SIZE = struct.calcsize(_SUMMARY)
+_ALARM_SIZE = struct.calcsize(_ALARM)
+_BATCH_SIZE = struct.calcsize(_BATCH)
+
+
+class Encoder:
+    """Packs telemetry into one preallocated buffer instead of building
+    JSON. Every method returns a memoryview of the buffer that is only
+    valid until the next call, copy it to keep it (bytes(view)).
+    :param fields: The field table, names the mask bits refer to, e.g.
+                   Frame.FIELDS. At most 32.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._buf = bytearray(_SUMMARY_SIZE + 16 * len(self.fields))
+        self._view = memoryview(self._buf)
+        self._layouts = {}
+
+    def _layout(self, fields):
+        # mask and the positions in fields in table order, cached per tuple
+        layout = self._layouts.get(fields)
+        if layout is None:
+            index = sorted((self.fields.index(name), j) for j, name in enumerate(fields))
+            mask = 0
+            for i, j in index:
+                mask |= 1 << i
+            layout = (mask, [j for i, j in index])
+            self._layouts[fields] = layout
+        return layout
+
+    def frame(self, seq, rec):
+        """Encode a `Record`, all its fields."""
+        mask, order = self._layout(rec.FIELDS)
+        buf = self._buf
+        struct.pack_into(_FRAME, buf, 0, VERSION, FRAME, seq, rec.timestamp, mask)
+        off = _FRAME_SIZE
+        values = rec.values
+        for j in order:
+            struct.pack_into('<f', buf, off, values[j])
+            off += 4
+        return self._view[:off]
+
+    def summary(self, seq, agg):
+        """Encode a `stats.Aggregate`."""
+        mask, order = self._layout(agg.fields)
+        buf = self._buf
+        struct.pack_into(_SUMMARY, buf, 0, VERSION, SUMMARY, seq,
+                         agg.timestamp, agg.start, agg.n, mask)
+        off = _SUMMARY_SIZE
+        for j in order:
+            struct.pack_into('<4f', buf, off, agg.min[j], agg.mean(j), agg.max[j], agg.last[j])
+            off += 16
+        return self._view[:off]
+
+    def alarm(self, seq, state):
+        """Encode an alarm change, state 'on' or 'off'."""
+        struct.pack_into(_ALARM, self._buf, 0, VERSION, ALARM, seq, 1 if state == 'on' else 0)
+        return self._view[:_ALARM_SIZE]
+
+
+class Batch:
+    """Collects the payloads of one topic to publish them as one message,
+    saving the MQTT and TCP overhead of all but one.
+    :param size: Payloads per batch, full() from then on.
+    :param max_bytes: Size of the framed batch as pack() returns it, add()
+                      refuses payloads that don't fit anymore. Keep it
+                      within the outbox's max_payload.
+    :param compress: Deflate the batch when that makes it smaller, it may
+                     then hold more than max_bytes of payloads. Once it
+                     does every add() deflates it to check the size. Needs
+                     the deflate module (MicroPython 1.21 on).
+    """
+
+    def __init__(self, size=8, max_bytes=1024, compress=False):
+        if compress and _compress is None:
+            raise ValueError('compression needs the deflate module')
+        self.size = size
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._buf = bytearray(max_bytes)
+        self._view = memoryview(self._buf)
+        self._packed = None  # deflated body, kept from the last size check
+        self._n = 0
+        self._end = _BATCH_SIZE
+        self._start = 0
+
+    def __len__(self):
+        return self._n
+
+    def full(self):
+        return self._n >= self.size
+
+    def age_ms(self):
+        """Milliseconds since the first payload of the batch was added."""
+        return utime.ticks_diff(utime.ticks_ms(), self._start) if self._n else 0
+
+    def add(self, payload):
+        """Append payload (copied), False if it doesn't fit."""
+        end = self._end + 2 + len(payload)
+        if end > self.max_bytes and not self.compress:
+            return False
+        if end > len(self._buf):
+            buf = bytearray(max(end, 2 * len(self._buf)))
+            buf[:self._end] = self._view[:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        struct.pack_into('<H', self._buf, self._end, len(payload))
+        self._buf[self._end + 2:end] = payload
+        packed = None
+        if end > self.max_bytes:
+            packed = _compress(self._view[_BATCH_SIZE:end])
+            if _BATCH_SIZE + len(packed) > self.max_bytes:
+                return False
+        self._packed = packed
+        if not self._n:
+            self._start = utime.ticks_ms()
+        self._end = end
+        self._n += 1
+        return True
+
+    def pack(self):
+        """Return the framed batch as new bytes and start the next one."""
+        kind = BATCH
+        body = self._view[_BATCH_SIZE:self._end]
+        if self.compress:
+            packed = self._packed
+            if packed is None:
+                packed = _compress(body)
+            if len(packed) < len(body):
+                kind |= DEFLATED
+                body = packed
+        struct.pack_into(_BATCH, self._buf, 0, VERSION, kind, self._n)
+        payload = bytes(self._view[:_BATCH_SIZE]) + body
+        self._packed = None
+        self._n = 0
+        self._end = _BATCH_SIZE
+        return payload
@@ -57,6 +57,9 @@ class EventLoop:
         # in the event loop (sub-coroutines executed transparently by
         # yield from/await, event loop "doesn't see" them).
         self.cur_task = None
+        # Profiling data, None unless enabled by profile()
+        self.prof = None
+        self._due = None
 
     def time(self):
         return time.ticks_ms()
@@ -68,6 +71,10 @@ class EventLoop:
         self.call_later_ms(0, coro)
         # CPython asyncio incompatibility: we don't return Task object
 
+    # Run callback(*args) every period_ms at fixed ticks, see Periodic
+    def call_every(self, period_ms, callback, *args):
+        self.create_task(_every(Periodic(period_ms), callback, args))
+
     def _call_now(self, callback, *args):  # For stream I/O only
         if __debug__ and DEBUG:
             log.debug("Scheduling in ioq: %s", (callback, args))
@@ -117,6 +124,60 @@ class EventLoop:
         if isinstance(callback, type_gen):
             callback.pend_throw(id(callback))
 
+    # Opt-in profiling. Per top-level task, prof maps the coro to
+    # [steps, total step us, max step us, timed wakeups, total late ms, max late ms]
+    # where lateness is measured against the time the task was scheduled for.
+    # A task's entry is dropped when it finishes, so short lived tasks don't
+    # pile up. When off the only cost is one test per step.
+    def profile(self, on=True, dump_ms=0):
+        if not on:
+            self.prof = None
+            self._due = None
+        elif self.prof is None:
+            self.prof = {}
+            self._due = {}
+            if dump_ms:
+                self.create_task(_prof_dump(self, dump_ms))
+        return self.prof
+
+    def _prof_entry(self, cb):
+        s = self.prof.get(cb)
+        if s is None:
+            s = self.prof[cb] = [0, 0, 0, 0, 0, 0]
+        return s
+
+    def _prof_start(self, cb):
+        t = self._due.pop(id(cb), None)
+        if t is not None:
+            s = self._prof_entry(cb)
+            late = time.ticks_diff(self.time(), t)
+            s[3] += 1
+            s[4] += late
+            if late > s[5]:
+                s[5] = late
+        return time.ticks_us()
+
+    def _prof_end(self, cb, t0):
+        if self.prof is None:  # Task turned profiling off
+            return
+        dt = time.ticks_diff(time.ticks_us(), t0)
+        s = self._prof_entry(cb)
+        s[0] += 1
+        s[1] += dt
+        if dt > s[2]:
+            s[2] = dt
+
+    def _prof_done(self, cb, t0):
+        self._prof_end(cb, t0)
+        if self.prof is not None:
+            del self.prof[cb]
+            self._due.pop(id(cb), None)
+
+    def prof_print(self):
+        for cb, s in self.prof.items():
+            print('{}: steps {} total {}us max {}us late avg {}ms max {}ms'.format(
+                cb, s[0], s[1], s[2], s[4] // s[3] if s[3] else 0, s[5]))
+
     def wait(self, delay):
         # Default wait implementation, to be overriden in subclasses
         # with IO scheduling
@@ -135,6 +196,8 @@ class EventLoop:
                 else:
                     cur_task[1].pend_throw(None)
                     self.call_soon(cur_task[1], *cur_task[2])
+                    if self._due is not None:
+                        self._due[tid] = cur_task[0]
             else:
                 self.call_soon(cur_task[1], *cur_task[2])
 
@@ -201,11 +264,16 @@ class EventLoop:
                 self.cur_task = cb  # Stored in a bound variable for TimeoutObj
                 delay = 0
                 low_priority = False  # Assume normal priority
+                prof = self.prof is not None
+                if prof:
+                    t0 = self._prof_start(cb)
                 try:
                     if args is ():
                         ret = next(cb)  # Schedule the coro, get result
                     else:
                         ret = cb.send(*args)
+                    if prof:
+                        self._prof_end(cb, t0)
                     if __debug__ and DEBUG:
                         log.info("Coroutine %s yield result: %s", cb, ret)
                     if isinstance(ret, SysCall1):  # Coro returned a SysCall1: an object with an arg spcified in its constructor
@@ -235,6 +303,10 @@ class EventLoop:
                             self.remove_writer(arg)
                             self._call_io(cb, args)  # Next call produces StopIteration: see StreamWriter.aclose
                             continue 
+                        elif isinstance(ret, Park):  # coro waits on a Queue, see unpark()
+                            cb.pend_throw(False)  # As for I/O: cancel() or a timeout puts it back on runq
+                            arg.append(cb)
+                            continue
                         elif isinstance(ret, StopLoop):  # e.g. from run_until_complete. run_forever() terminates
                             return arg
                         else:
@@ -254,8 +326,12 @@ class EventLoop:
                 except StopIteration as e:
                     if __debug__ and DEBUG:
                         log.debug("Coroutine finished: %s", cb)
+                    if prof:
+                        self._prof_done(cb, t0)
                     continue
                 except CancelledError as e:
+                    if prof:
+                        self._prof_done(cb, t0)
                     if __debug__ and DEBUG:
                         log.debug("Coroutine cancelled: %s", cb)
                     continue
@@ -378,6 +454,109 @@ _stop_iter = StopIteration()
 sleep_ms = SleepMs()
 
 
+# Park the current task on a list of waiters until some other task calls
+# unpark() on it. The task is not on any queue meanwhile, so it costs nothing
+# while it waits. Same zero heap approach as SleepMs.
+class Park(SysCall1):
+
+    def __init__(self):
+        self.v = None
+        self.arg = None
+
+    def __call__(self, waiters):
+        self.v = waiters
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.v is not None:
+            self.arg = self.v
+            self.v = None
+            return self
+        _stop_iter.__traceback__ = None
+        raise _stop_iter
+
+park = Park()
+
+
+# Put a parked task back on runq. Returns False if it isn't parked anymore
+# (e.g. it was cancelled or timed out in the meantime).
+def unpark(coro):
+    prev = coro.pend_throw(None)
+    if prev is False:
+        _event_loop.call_soon(coro)
+        return True
+    coro.pend_throw(prev)
+    return False
+
+
+# Wait on a list of waiters until woken by wake(). If the wait ends with an
+# exception (cancel or timeout) after a wakeup was already delivered, the
+# wakeup is handed on to the next waiter so it doesn't get lost.
+def wait_on(waiters):
+    task = _event_loop.cur_task
+    try:
+        yield from park(waiters)
+    except:
+        if task in waiters:
+            waiters.remove(task)
+        else:
+            wake(waiters)
+        raise
+
+
+# Wake the longest waiting task of waiters. Returns False if there was none.
+def wake(waiters):
+    while waiters:
+        if unpark(waiters.pop(0)):
+            return True
+    return False
+
+
+class Periodic:
+    """Fires every period_ms at absolute ticks epoch + n * period_ms.
+
+    Unlike sleeping for a fixed time after each run, the period doesn't
+    stretch by the time the task itself or the loop takes, and tasks sharing
+    an epoch stay phase aligned. Ticks that have already passed completely
+    are skipped instead of run back to back and counted in missed.
+
+    Usage::
+
+        period = Periodic(1500)
+        while True:
+            do_work()
+            yield from period.wait()
+    """
+
+    def __init__(self, period_ms, epoch=None):
+        self.period = period_ms
+        self.next = time.ticks_ms() if epoch is None else epoch
+        self.missed = 0
+
+    def wait(self):
+        # Returns the number of ticks missed since the previous wait()
+        late = time.ticks_diff(time.ticks_ms(), self.next)
+        missed = 0
+        if late >= self.period:
+            missed = late // self.period
+            self.next = time.ticks_add(self.next, missed * self.period)
+            self.missed += missed
+        delay = time.ticks_diff(self.next, time.ticks_ms())
+        if delay > 0:
+            yield delay
+        self.next = time.ticks_add(self.next, self.period)
+        return missed
+
+
+def _every(periodic, callback, args):
+    while True:
+        yield from periodic.wait()
+        callback(*args)
+
+
 def cancel(coro):
     prev = coro.pend_throw(CancelledError())
     if prev is False:  # Waiting on I/O. Not on q so put it there.
@@ -430,6 +609,13 @@ def wait_for(coro, timeout):
 def coroutine(f):
     return f
 
+
+def _prof_dump(loop, period):
+    while loop.prof is not None:
+        yield period
+        if loop.prof is not None:
+            loop.prof_print()
+
 # Low priority
 class AfterMs(SleepMs):
     pass
@@ -1,5 +1,5 @@
 from collections.deque import deque
-from uasyncio.core import sleep
+from uasyncio.core import wait_on, wake, wait_for_ms, TimeoutError
 
 
 class QueueEmpty(Exception):
@@ -20,12 +20,24 @@ class Queue:
     Unlike the standard library Queue, you can reliably know this Queue's size
     with qsize(), since your single-threaded uasyncio application won't be
     interrupted between calling qsize() and doing an operation on the Queue.
+
+    Blocked getters and putters are parked and woken by the other side, so
+    they don't poll and use no CPU while they wait.
     """
-    _attempt_delay = 0.1
 
     def __init__(self, maxsize=0):
         self.maxsize = maxsize
         self._queue = deque()
+        self._getters = []
+        self._putters = []
+
+    def _wake_many(self, waiters, n):
+        for i in range(min(n, len(waiters))):
+            wake(waiters)
+
+    def _until_items(self):
+        while not self._queue:
+            yield from wait_on(self._getters)
 
     def _get(self):
         return self._queue.popleft()
@@ -38,9 +50,47 @@ class Queue:
 
             item = yield from queue.get()
         """
-        while not self._queue:
-            yield from sleep(self._attempt_delay)
-        return self._get()
+        yield from self._until_items()
+        val = self._get()
+        wake(self._putters)
+        return val
+
+    def get_many(self, max_n=0, timeout_ms=None):
+        """Returns generator, which can be used for getting (and removing)
+        up to max_n items (all if max_n is 0) from a queue in one go.
+
+        Waits until at least one item is available, or at most timeout_ms
+        (forever if None). Returns an empty list on timeout. Every call
+        that waits with a timeout holds a slot in the loop's waitq until
+        timeout_ms passed, even when items arrive earlier, so don't call
+        it in a loop with long timeouts.
+
+        Usage::
+
+            items = yield from queue.get_many(16, 500)
+        """
+        if not self._queue:
+            if timeout_ms is None:
+                yield from self._until_items()
+            elif timeout_ms <= 0:
+                return []
+            else:
+                try:
+                    yield from wait_for_ms(self._until_items(), timeout_ms)
+                except TimeoutError:
+                    return []
+        return self.get_many_nowait(max_n)
+
+    def get_many_nowait(self, max_n=0):
+        """Remove and return up to max_n items (all if max_n is 0) from
+        the queue. Returns an empty list if the queue is empty.
+        """
+        n = len(self._queue)
+        if max_n and max_n < n:
+            n = max_n
+        items = [self._get() for i in range(n)]
+        self._wake_many(self._putters, len(items))
+        return items
 
     def get_nowait(self):
         """Remove and return an item from the queue.
@@ -49,7 +99,9 @@ class Queue:
         """
         if not self._queue:
             raise QueueEmpty()
-        return self._get()
+        val = self._get()
+        wake(self._putters)
+        return val
 
     def _put(self, val):
         self._queue.append(val)
@@ -62,8 +114,27 @@ class Queue:
             yield from queue.put(item)
         """
         while self.qsize() >= self.maxsize and self.maxsize:
-            yield from sleep(self._attempt_delay)
+            yield from wait_on(self._putters)
         self._put(val)
+        wake(self._getters)
+
+    def put_many(self, items):
+        """Returns generator which can be used for putting several items in
+        a queue. Only blocks if the queue runs full.
+
+        Usage::
+
+            yield from queue.put_many(items)
+        """
+        n = 0
+        for val in items:
+            while self.qsize() >= self.maxsize and self.maxsize:
+                self._wake_many(self._getters, n)
+                n = 0
+                yield from wait_on(self._putters)
+            self._put(val)
+            n += 1
+        self._wake_many(self._getters, n)
 
     def put_nowait(self, val):
         """Put an item into the queue without blocking.
@@ -73,6 +144,7 @@ class Queue:
         if self.qsize() >= self.maxsize and self.maxsize:
             raise QueueFull()
         self._put(val)
+        wake(self._getters)
 
     def qsize(self):
         """Number of items in the queue."""
@@ -92,3 +164,82 @@ class Queue:
             return False
         else:
             return self.qsize() >= self.maxsize
+
+
+class ConflatingQueue(Queue):
+    """A queue that only keeps the newest item per key.
+
+    Putting an item whose key is already waiting replaces the old item in
+    place, so consumers always see the current state and never work through
+    stale updates. key(item) defaults to item[0], the tag of the usual
+    (tag, data) messages. Size and maxsize count keys, not puts.
+    """
+
+    def __init__(self, maxsize=0, key=None):
+        super().__init__(maxsize)
+        self._key = key if key is not None else (lambda item: item[0])
+        self._latest = {}
+
+    def _get(self):
+        return self._latest.pop(self._queue.popleft())
+
+    def _put(self, val):
+        k = self._key(val)
+        if k not in self._latest:
+            self._queue.append(k)
+        self._latest[k] = val
+
+    def put(self, val):
+        if self._key(val) in self._latest:
+            self._put(val)  # replacing never needs a free slot
+            return
+        yield from super().put(val)
+
+    def put_nowait(self, val):
+        if self._key(val) in self._latest:
+            self._put(val)
+            return
+        super().put_nowait(val)
+
+
+class _Levels:
+    # One FIFO per priority level, looks like a single deque to Queue
+
+    def __init__(self, levels):
+        self.qs = [deque() for i in range(levels)]
+        self.n = 0
+
+    def append(self, level, val):
+        self.qs[level].append(val)
+        self.n += 1
+
+    def popleft(self):
+        for q in self.qs:
+            if q:
+                self.n -= 1
+                return q.popleft()
+        raise IndexError('pop from an empty queue')
+
+    def __len__(self):
+        return self.n
+
+    def __bool__(self):
+        return self.n > 0
+
+
+class PriorityQueue(Queue):
+    """A queue with a fixed number of priority levels.
+
+    prio(item) returns the level of an item, 0 being the most urgent. Items
+    are returned lowest level first and FIFO within a level, so urgent
+    messages never wait behind a backlog of routine ones. Put and get are
+    O(levels).
+    """
+
+    def __init__(self, prio, levels=2, maxsize=0):
+        super().__init__(maxsize)
+        self._prio = prio
+        self._queue = _Levels(levels)
+
+    def _put(self, val):
+        self._queue.append(self._prio(val), val)
@@ -0,0 +1,37 @@
+from uasyncio.core import wait_on, wake
+
+
+class Lock:
+    """A mutex for coroutines.
+
+    Waiting tasks are parked and handed the lock in FIFO order on release.
+
+    Usage::
+
+        yield from lock.acquire()
+        try:
+            ...
+        finally:
+            lock.release()
+    """
+
+    def __init__(self):
+        self.locked = False
+        self._waiters = []
+
+    def acquire(self):
+        while self.locked:
+            yield from wait_on(self._waiters)
+        self.locked = True
+
+    def release(self):
+        assert self.locked, 'Lock not acquired'
+        self.locked = False
+        wake(self._waiters)
+
+    def __aenter__(self):
+        return self.acquire()
+
+    def __aexit__(self, *args):
+        self.release()
+        yield from ()
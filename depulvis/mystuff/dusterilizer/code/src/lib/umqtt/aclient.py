@@ -0,0 +1,339 @@
+import uasyncio as asyncio
+from uasyncio.synchro import Lock
+from uasyncio.core import wait_on, wake
+import ustruct as struct
+import utime
+from umqtt.simple import MQTTException, _b, _pack_len, _pack_str, _pack_publish, _publish_size
+
+
+class MQTTClient:
+    """MQTT client running on uasyncio streams.
+
+    Unlike umqtt.simple it never blocks the event loop: a reader task
+    handles incoming packets (PUBLISH is passed to the callback, PUBACK,
+    SUBACK and PINGRESP are consumed), a keepalive task sends PINGREQ and
+    detects a dead broker, and a lost connection is re-established in the
+    background with exponential backoff. publish() raises OSError while
+    disconnected.
+
+    QoS 1 messages are pipelined: publish() returns once the packet is
+    written and waits only while `inflight` messages are unacknowledged.
+    The reader matches PUBACKs by packet id. Unacknowledged messages are
+    sent again with DUP set after a reconnect and after retry_ms without
+    a PUBACK, so they arrive at least once as long as the client lives.
+    set_ack_callback() tells when the PUBACK of a packet id arrived.
+    """
+
+    def __init__(self, client_id, server, port=1883, user=None, password=None, keepalive=60,
+                 timeout_ms=5000, reconnect_ms=1000, reconnect_max_ms=30000,
+                 inflight=8, retry_ms=10000):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.timeout_ms = timeout_ms
+        self.reconnect_ms = reconnect_ms
+        self.reconnect_max_ms = reconnect_max_ms
+        self.inflight = inflight
+        self.retry_ms = retry_ms
+        self.pid = 0
+        self.cb = None
+        self.ack_cb = None
+        self._subs = []
+        self._unacked = {}  # pid: [packet, length, ticks of the last send]
+        self._window = []   # tasks waiting for a free in-flight slot
+        self._lock = Lock()
+        self._buf = bytearray(64)  # QoS 0 packets, only touched under _lock
+        self._reader = None
+        self._writer = None
+        self._rd_task = None
+        self._gen = 0  # connection generation, tasks of older ones exit
+        self._last_rx = 0
+        self._closing = False
+        self._reconnecting = False
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_ack_callback(self, f):
+        # f(pid) for every PUBACK of a message in flight
+        self.ack_cb = f
+
+    def isconnected(self):
+        return self._reader is not None
+
+    def _connect_packet(self, clean_session):
+        sz = 10 + 2 + len(self.client_id)
+        if self.user is not None:
+            sz += 2 + len(self.user) + 2 + len(self.pswd)
+        pkt = bytearray(sz + 5)
+        pkt[0] = 0x10
+        i = _pack_len(pkt, 1, sz)
+        pkt[i:i + 7] = b"\x00\x04MQTT\x04"
+        flags = clean_session << 1
+        if self.user is not None:
+            flags |= 0xC0
+        struct.pack_into("!BH", pkt, i + 7, flags, self.keepalive)
+        i = _pack_str(pkt, i + 10, self.client_id)
+        if self.user is not None:
+            i = _pack_str(pkt, i, self.user)
+            i = _pack_str(pkt, i, self.pswd)
+        return pkt, i
+
+    async def _handshake(self, reader, clean_session):
+        pkt, n = self._connect_packet(clean_session)
+        await self._writer.awrite(pkt, 0, n)
+        resp = await reader.readexactly(4)
+        if len(resp) != 4 or resp[0] != 0x20 or resp[1] != 0x02:
+            raise OSError(-1)
+        if resp[3] != 0:
+            raise MQTTException(resp[3])
+        return resp[2] & 1
+
+    async def connect(self, clean_session=True):
+        """Connect to the broker and start the reader and keepalive tasks.
+        Returns the session present flag of the CONNACK.
+        """
+        self._closing = False
+        self._close()
+        # A failing TCP connect errors out by itself, only the MQTT handshake
+        # needs a timeout. _close() also unregisters the socket from poll.
+        reader, self._writer = await asyncio.open_connection(self.server, self.port)
+        try:
+            present = await asyncio.wait_for_ms(self._handshake(reader, clean_session),
+                                                self.timeout_ms)
+        except Exception:
+            self._close()
+            raise
+        self._reader = reader
+        self._last_rx = utime.ticks_ms()
+        loop = asyncio.get_event_loop()
+        self._rd_task = self._read_loop(self._gen)
+        loop.create_task(self._rd_task)
+        if self.keepalive:
+            loop.create_task(self._keepalive_loop(self._gen))
+        loop.create_task(self._retry_loop(self._gen))
+        for topic, qos in self._subs:
+            await self._send_subscribe(topic, qos)
+        # the broker may or may not have got them, send again in order
+        await self._resend(None)
+        return present
+
+    async def disconnect(self):
+        self._closing = True
+        if self._writer is not None:
+            try:
+                await self._write(b"\xe0\0")
+            except OSError:
+                pass
+        self._close()
+
+    def _close(self):
+        writer = self._writer
+        if writer is None:
+            return
+        self._gen += 1
+        self._reader = None
+        self._writer = None
+        loop = asyncio.get_event_loop()
+        loop.remove_reader(writer.s)
+        loop.remove_writer(writer.s)
+        rd_task = self._rd_task
+        self._rd_task = None
+        if rd_task is not None and rd_task is not loop.cur_task:
+            asyncio.cancel(rd_task)
+        writer.s.close()
+
+    def _lost(self):
+        # Connection broke: drop it and reconnect in the background
+        self._close()
+        if not self._closing:
+            self.reconnect()
+
+    def reconnect(self):
+        """Start connecting in the background, retrying with backoff until
+        it succeeds. Returns immediately.
+        """
+        if not self._reconnecting:
+            self._reconnecting = True
+            asyncio.get_event_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = self.reconnect_ms
+        while not self._closing:
+            try:
+                await self.connect(False)
+                break
+            except Exception as e:
+                print('mqtt connect failed: ' + str(e))
+            await asyncio.sleep_ms(delay)
+            delay = min(delay * 2, self.reconnect_max_ms)
+        self._reconnecting = False
+
+    async def _write(self, buf, n=-1, topic=None, msg=None, retain=False):
+        # With a topic buf is None and n the size of a QoS 0 PUBLISH that
+        # is packed into self._buf once the lock is ours, an earlier
+        # writer may still be sending it until then
+        if self._reader is None:
+            raise OSError(-1)
+        gen = self._gen
+        await self._lock.acquire()
+        try:
+            if gen != self._gen:
+                raise OSError(-1)
+            if topic is not None:
+                buf = self._buf
+                if len(buf) < n:
+                    buf = self._buf = bytearray(n)
+                n = _pack_publish(buf, 0, topic, msg, retain, 0, 0)
+            await self._writer.awrite(buf, 0, n)
+        except OSError:
+            if gen == self._gen:
+                self._lost()
+            raise
+        finally:
+            self._lock.release()
+
+    def _next_pid(self):
+        pid = self.pid
+        while True:
+            pid = pid % 65535 + 1
+            if pid not in self._unacked:
+                break
+        self.pid = pid
+        return pid
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        """Send a message in a single write. With qos 1 first waits for a
+        free in-flight slot and returns the packet id."""
+        assert qos < 2, 'Only QoS 0 and 1 supported'
+        topic = _b(topic)
+        msg = _b(msg)
+        if qos == 0:
+            await self._write(None, _publish_size(topic, msg, 0), topic, msg, retain)
+            return
+        if self._reader is None:
+            raise OSError(-1)
+        while len(self._unacked) >= self.inflight:
+            await wait_on(self._window)
+        # kept for the resends, so it gets a buffer of its own
+        pkt = bytearray(_publish_size(topic, msg, qos))
+        pid = self._next_pid()
+        n = _pack_publish(pkt, 0, topic, msg, retain, 1, pid)
+        self._unacked[pid] = [pkt, n, utime.ticks_ms()]
+        try:
+            await self._write(pkt, n)
+        except OSError:
+            # the message is ours now, the reconnect sends it again
+            pass
+        return pid
+
+    def pending(self):
+        """Number of QoS 1 messages not acknowledged yet."""
+        return len(self._unacked)
+
+    async def _resend(self, older_ms):
+        # Send the unacknowledged messages again with DUP, all of them or
+        # those last sent more than older_ms ago
+        now = utime.ticks_ms()
+        for pid in sorted(self._unacked):
+            entry = self._unacked.get(pid)
+            if entry is None or older_ms is not None and utime.ticks_diff(now, entry[2]) < older_ms:
+                continue
+            entry[0][0] |= 0x08
+            entry[2] = utime.ticks_ms()
+            await self._write(entry[0], entry[1])
+
+    async def _retry_loop(self, gen):
+        while True:
+            await asyncio.sleep_ms(self.retry_ms // 2)
+            if gen != self._gen:
+                return
+            try:
+                await self._resend(self.retry_ms)
+            except OSError:
+                return
+
+    async def _send_subscribe(self, topic, qos):
+        pkt = bytearray(2 + 2 + 2 + len(topic) + 1)
+        struct.pack_into("!BBH", pkt, 0, 0x82, len(pkt) - 2, self._next_pid())
+        i = _pack_str(pkt, 4, topic)
+        pkt[i] = qos
+        await self._write(pkt)
+
+    async def subscribe(self, topic, qos=0):
+        """Subscribe to topic, also after a reconnect. Messages are passed
+        to the callback set by set_callback().
+        """
+        assert self.cb is not None, "Subscribe callback is not set"
+        self._subs.append((topic, qos))
+        await self._send_subscribe(topic, qos)
+
+    async def _read_exactly(self, n):
+        buf = await self._reader.readexactly(n)
+        if len(buf) != n:
+            raise OSError(-1)  # EOF
+        return buf
+
+    async def _read_loop(self, gen):
+        try:
+            while gen == self._gen:
+                # type and the first length byte in one read, which is all
+                # of the length below 128 bytes
+                hdr = await self._read_exactly(2)
+                op = hdr[0]
+                b = hdr[1]
+                sz = b & 0x7f
+                sh = 7
+                while b & 0x80:
+                    b = (await self._read_exactly(1))[0]
+                    sz |= (b & 0x7f) << sh
+                    sh += 7
+                body = await self._read_exactly(sz) if sz else b""
+                self._last_rx = utime.ticks_ms()
+                await self._handle(op, body)
+        except Exception as e:
+            if gen == self._gen:
+                print('mqtt connection lost: ' + str(e))
+                self._lost()
+
+    async def _handle(self, op, body):
+        # Called by the reader task for every incoming packet
+        if op & 0xf0 == 0x30:  # PUBLISH
+            i = 2 + (body[0] << 8 | body[1])
+            topic = body[2:i]
+            if op & 6:
+                pid = body[i] << 8 | body[i + 1]
+                i += 2
+            if self.cb is not None:
+                self.cb(topic, body[i:])
+            if op & 6 == 2:
+                pkt = bytearray(b"\x40\x02\0\0")
+                struct.pack_into("!H", pkt, 2, pid)
+                await self._write(pkt)
+        elif op == 0x40:  # PUBACK
+            pid = body[0] << 8 | body[1]
+            if self._unacked.pop(pid, None) is not None:
+                wake(self._window)
+                if self.ack_cb is not None:
+                    self.ack_cb(pid)
+        elif op == 0x90:  # SUBACK
+            if body[-1] == 0x80:
+                print('mqtt subscribe refused')
+
+    async def _keepalive_loop(self, gen):
+        ka = self.keepalive * 1000
+        while True:
+            await asyncio.sleep_ms(ka // 2)
+            if gen != self._gen:
+                return
+            if utime.ticks_diff(utime.ticks_ms(), self._last_rx) > ka * 3 // 2:
+                print('mqtt broker timed out')
+                self._lost()
+                return
+            try:
+                await self._write(b"\xc0\0")
+            except OSError:
+                return
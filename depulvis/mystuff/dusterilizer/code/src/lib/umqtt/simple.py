@@ -5,10 +5,54 @@ from ubinascii import hexlify
 class MQTTException(Exception):
     pass
 
+
+def _pack_len(buf, i, sz):
+    # Write the MQTT remaining length at buf[i], return index after it
+    while sz > 0x7f:
+        buf[i] = (sz & 0x7f) | 0x80
+        sz >>= 7
+        i += 1
+    buf[i] = sz
+    return i + 1
+
+
+def _pack_str(buf, i, s):
+    s = _b(s)
+    struct.pack_into("!H", buf, i, len(s))
+    buf[i + 2:i + 2 + len(s)] = s
+    return i + 2 + len(s)
+
+
+def _b(s):
+    return s.encode() if isinstance(s, str) else s
+
+
+def _publish_size(topic, msg, qos):
+    # Bytes of the PUBLISH packet, at most 4 length bytes
+    sz = 2 + len(topic) + len(msg)
+    if qos > 0:
+        sz += 2
+    assert sz < 2097152
+    return sz + 1 + (1 if sz < 0x80 else 2 if sz < 0x4000 else 3)
+
+
+def _pack_publish(buf, i, topic, msg, retain, qos, pid):
+    # Write a PUBLISH packet at buf[i], return index after it
+    sz = 2 + len(topic) + len(msg)
+    if qos > 0:
+        sz += 2
+    buf[i] = 0x30 | qos << 1 | retain
+    i = _pack_str(buf, _pack_len(buf, i + 1, sz), topic)
+    if qos > 0:
+        struct.pack_into("!H", buf, i, pid)
+        i += 2
+    buf[i:i + len(msg)] = msg
+    return i + len(msg)
+
 class MQTTClient:
 
     def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
-                 ssl=False, ssl_params={}):
+                 ssl=False, ssl_params={}, buf_size=256):
         if port == 0:
             port = 8883 if ssl else 1883
         self.client_id = client_id
@@ -26,6 +70,9 @@ class MQTTClient:
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
+        # PUBLISH packets are assembled here and sent with a single write,
+        # grown when a message doesn't fit
+        self._buf = bytearray(buf_size)
 
     def _send_str(self, s):
         self.sock.write(struct.pack("!H", len(s)))
@@ -106,46 +153,75 @@ class MQTTClient:
     def ping(self):
         self.sock.write(b"\xc0\0")
 
+    def _reserve(self, n):
+        if len(self._buf) < n:
+            self._buf = bytearray(n)
+        return self._buf
+
+    def _next_pid(self):
+        # packet ids are 1..65535
+        self.pid = self.pid % 65535 + 1
+        return self.pid
+
     def publish(self, topic, msg, retain=False, qos=0):
-        pkt = bytearray(b"\x30\0\0\0")
-        pkt[0] |= qos << 1 | retain
-        sz = 2 + len(topic) + len(msg)
-        if qos > 0:
-            sz += 2
-        assert sz < 2097152
-        i = 1
-        while sz > 0x7f:
-            pkt[i] = (sz & 0x7f) | 0x80
-            sz >>= 7
-            i += 1
-        pkt[i] = sz
-        #print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt, i + 1)
-        self._send_str(topic)
-        if qos > 0:
-            self.pid += 1
-            pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.write(pkt, 2)
-        self.sock.write(msg)
+        topic = _b(topic)
+        msg = _b(msg)
+        buf = self._reserve(_publish_size(topic, msg, qos))
+        pid = self._next_pid() if qos > 0 else 0
+        n = _pack_publish(buf, 0, topic, msg, retain, qos, pid)
+        self.sock.write(buf, n)
         if qos == 1:
-            while 1:
-                op = self.wait_msg()
-                if op == 0x40:
-                    sz = self.sock.read(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.read(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
-                    if pid == rcv_pid:
-                        return
+            self._wait_puback(pid, 1)
         elif qos == 2:
             assert 0
 
+    def publish_many(self, msgs, retain=False, qos=0):
+        """Send the (topic, msg) pairs of msgs, packed back to back into as
+        few writes as the buffer allows (a message bigger than the buffer
+        grows it). With qos 1 returns once all of them are acknowledged.
+        """
+        assert qos < 2
+        buf = self._buf
+        n = 0
+        first = self.pid % 65535 + 1
+        count = 0
+        for topic, msg in msgs:
+            topic = _b(topic)
+            msg = _b(msg)
+            sz = _publish_size(topic, msg, qos)
+            if n + sz > len(buf):
+                if n:
+                    self.sock.write(buf, n)
+                    n = 0
+                buf = self._reserve(sz)
+            pid = 0
+            if qos > 0:
+                pid = self._next_pid()
+                count += 1
+            n = _pack_publish(buf, n, topic, msg, retain, qos, pid)
+        if n:
+            self.sock.write(buf, n)
+        if count:
+            self._wait_puback(first, count)
+
+    def _wait_puback(self, first, count):
+        # Consume PUBACKs until the count pids from first on (wrapping
+        # after 65535) were acknowledged
+        left = count
+        while left:
+            op = self.wait_msg()
+            if op == 0x40:
+                sz = self.sock.read(1)
+                assert sz == b"\x02"
+                rcv_pid = self.sock.read(2)
+                rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
+                if (rcv_pid - first) % 65535 < count:
+                    left -= 1
+
     def subscribe(self, topic, qos=0):
         assert self.cb is not None, "Subscribe callback is not set"
         pkt = bytearray(b"\x82\0\0\0")
-        self.pid += 1
-        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self.pid)
+        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self._next_pid())
         #print(hex(len(pkt)), hexlify(pkt, ":"))
         self.sock.write(pkt)
         self._send_str(topic)
@@ -1,5 +1,8 @@
 import uasyncio as asyncio
-from uasyncio.queues import Queue
+from uasyncio.queues import ConflatingQueue, PriorityQueue
+from bus import Bus
+from i2cbus import I2CBus
+from stats import Stats
 from machine import I2C, Pin
 import network
 import utime
@@ -10,8 +13,8 @@ import ujson
 
 from tasks.display_task import *
 from tasks.mqtt_task import *
-from tasks.sps30_task import *
-from tasks.sht31_task import *
+from tasks.acquisition_task import *
+from tasks.aggregate_task import *
 from tasks.logic_task import *
 
 def init_dip_button():
@@ -58,34 +61,42 @@ async def main_task(loop):
     ntptime.settime() # set time
     #config_num = init_dip_button()
     config_num = 5
-    i2c = init_i2c()
+    i2c = I2CBus(init_i2c())
+    #loop.call_every(60000, i2c.print_stats) # per device i2c latency and errors
     lan = init_lan()
     init_fan()
 
     print(config_num)
 
     # configs
+    epoch = utime.ticks_ms()
+    # frames and events are published by reference from rings of records,
+    # the queues holding them are kept shorter than the rings
+    backlog = 16
     display_config = {
         'pin_r': 16,
         'pin_l': 17,
         'num_leds': 14,
         'update_rate': 1.5
     }
-    sps30_config = {
+    acquisition_config = {
         'i2c': i2c,
-        'lock': None,
-        'update_rate': 1.5
-    }
-    sht31_config = {
-        'i2c': i2c,
-        'lock': None,
-        'update_rate': 1.5
+        'update_rate': 1.0, # near the threshold, the SPS30 delivers 1/s
+        'slow_rate': 10, # in clean air
+        'epoch': epoch,
+        'sensors': ('sps30', 'sht31', 'sgp30'),
+        'sht31_mps': 2, # faster than update_rate, a fetch must find new data
+        'records': backlog + 1
     }
     logic_config = {
         'logic_pin': 33
     }
     mqtt_config = {
-        'broker': '192.168.50.100'
+        'broker': '192.168.50.100',
+        'outbox': 'outbox', # spill directory while the broker is unreachable
+        'format': 'binary', # or 'json', both decode with host/telemetry.py
+        'qos': 1, # pipelined, up to 'inflight' (8) messages unacknowledged
+        'coalesce': 0 # e.g. 10 to send the summaries in batches of 10
     }
 
     f = open('config.json', 'r')
@@ -95,59 +106,96 @@ async def main_task(loop):
     mode = configs[config_num]["mode"]
     thres = configs[config_num]["thres"]
 
-    # initialize queues
-    main_queue = Queue()
-    display_queue = Queue()
-    mqtt_queue = Queue()
-    logic_queue = Queue()
+    # rolling statistics of the frames, the histograms resolve values up
+    # to twice the thresholds
+    ranges = {'pm10_mass': (0, 2 * thres['pm10'])}
+    jumps = {'pm10_mass': thres['pm10'] / 2}
+    if mode == 'all':
+        ranges['eco2'] = (400, 400 + 2 * thres['co2'])
+        ranges['tvoc'] = (0, 2 * thres['voc'])
+        jumps['eco2'] = thres['co2'] / 2
+        jumps['tvoc'] = thres['voc'] / 2
+    stats = Stats(Frame, fields=ranges.keys(), size=5, ranges=ranges)
+
+    # mqtt gets a summary per minute, and single frames on alarms and on
+    # jumps of half a threshold
+    aggregate_config = {
+        'window_s': 60,
+        'jumps': jumps,
+        'queue': backlog,
+        'event_records': backlog + 1
+    }
+
+    # initialize bus and subscriptions
+    bus = Bus()
+    # status messages and alarms overtake routine samples
+    main_queue = bus.subscribe(['sps30_info', 'sht31_info', 'sgp30_info', 'frame'],
+                               PriorityQueue(lambda msg: 0 if msg[0].endswith('_info') else 1, maxsize=backlog))
+    # display and relay only care about the current state
+    display_queue = bus.subscribe(['percent', 'percent_smooth'], ConflatingQueue())
+    logic_queue = bus.subscribe(['relay'], ConflatingQueue())
+    # mqtt_task hands everything to its outbox right away, never waiting
+    # for the broker
+    mqtt_queue = bus.subscribe(['summary', 'event', 'alarm'],
+                               PriorityQueue(lambda msg: 1 if msg[0] == 'summary' else 0, maxsize=backlog))
 
     # initialize tasks
     display_instance = display_task(display_queue, display_config)
     mqtt_instance = mqtt_task(mqtt_queue, mqtt_config)
-    sps30_instance = sps30_task(main_queue, sps30_config)
-    sht31_instance = sht31_task(main_queue, sht31_config)
+    acquisition_instance = acquisition_task(bus, acquisition_config)
+    aggregate_instance = aggregate_task(bus, aggregate_config)
     logic_instance = logic_task(logic_queue, logic_config)
 
     # starting tasks
     loop.create_task(display_instance)
     loop.create_task(mqtt_instance)
-    loop.create_task(sps30_instance)
-    loop.create_task(sht31_instance)
+    loop.create_task(acquisition_instance)
+    loop.create_task(aggregate_instance)
     loop.create_task(logic_instance)
 
     print("Config: " + str(config_num))
-    await display_queue.put(('percent', config_num/8)) # TODO: change config_num
+    bus.publish('percent', config_num/8) # TODO: change config_num
     time.sleep(2)
 
     pm10_percent = 0
     co2_percent = 0
     voc_percent = 0
+    alarm = False
 
     while True:
-        msg = await main_queue.get()
-        data = msg[1]
-        if msg[0] == 'sps30_info':
-            #print(data)
-            pass
-        elif msg[0] == 'sps30_data':
-            pm10_percent = data["pm10_mass"] / thres["pm10"]
-            print("PM10: " + str(data["pm10_mass"]))
-            await mqtt_queue.put(('pm', data))
-        elif msg[0] == 'sht31_info':
-            print(data)
-        elif msg[0] == 'sht31_data':
-            print(data)
-        else:
-            print('unkown message: ' + msg[0])
+        # one frame per acquisition epoch, take one decision per batch
+        for msg in await main_queue.get_many(16):
+            data = msg[1]
+            if msg[0] == 'frame':
+                # decide on the median of the last frames, a single noisy
+                # sample doesn't switch the relay
+                stats.update(data)
+                pm10_percent = stats['pm10_mass'].median() / thres["pm10"]
+                print("PM10: " + str(data["pm10_mass"]))
+                if mode == 'all':
+                    # the SGP30 reports 400 ppm eCO2 in clean air
+                    co2_percent = max(stats['eco2'].median() - 400, 0) / thres["co2"]
+                    voc_percent = stats['tvoc'].median() / thres["voc"]
+            elif msg[0] == 'sps30_info':
+                #print(data)
+                pass
+            elif msg[0].endswith('_info'):
+                print(msg[0] + ': ' + data)
+            else:
+                print('unkown message: ' + msg[0])
 
         display_percent = max(pm10_percent, co2_percent, voc_percent)
         if display_percent >= 1.0:
-            await logic_queue.put(('on', ''))
+            bus.publish('relay', 'on')
         else:
-            await logic_queue.put(('off', ''))
-        await display_queue.put(('percent_smooth', display_percent))
+            bus.publish('relay', 'off')
+        if (display_percent >= 1.0) != alarm:
+            alarm = not alarm
+            bus.publish('alarm', 'on' if alarm else 'off')
+        bus.publish('percent_smooth', display_percent)
 
 if __name__ == '__main__':
     loop = asyncio.get_event_loop()
+    #loop.profile(dump_ms=10000) # print per task step times and lateness every 10s
     loop.create_task(main_task(loop))
     loop.run_forever()
@@ -0,0 +1,130 @@
+from sps30 import SPS30, PMData
+from sht31 import SHT31
+from sgp30 import SGP30
+from record import Record, Ring
+from uasyncio.queues import ConflatingQueue
+import uasyncio as asyncio
+import utime
+import time
+
+# A new SGP30 needs this long before its baseline is worth saving
+BASELINE_LEARN_MS = 12 * 3600 * 1000
+
+class Frame(Record):
+    """All sensor readings of one acquisition epoch under one timestamp.
+    Fields of sensors that are missing stay 0."""
+    FIELDS = PMData.FIELDS + ('humidity', 'temperature', 'eco2', 'tvoc')
+
+# sensor name: (driver, offset of its fields in Frame)
+SENSORS = {
+    'sps30': (SPS30, 0),
+    'sht31': (SHT31, len(PMData.FIELDS)),
+    'sgp30': (SGP30, len(PMData.FIELDS) + 2),
+}
+
+def frame_every(percent, slow, low=0.5, high=0.9):
+    """Return after how many ticks to take the next frame when the readings
+    are at percent of their threshold: every slow ticks up to low, every
+    tick from high on, linear in between."""
+    if percent >= high:
+        return 1
+    if percent <= low:
+        return slow
+    return 1 + int((slow - 1) * (high - percent) / (high - low) + 0.5)
+
+async def acquisition_task(bus, config):
+    """Read all sensors back to back once per epoch and publish one
+    ('frame', Frame) message. Sensor problems are published as
+    ('<name>_info', 'ok'/'error').
+
+    The epoch adapts to the 'percent_smooth' published by main_task: a
+    frame every update_rate seconds (the sensors' fastest) close to the
+    threshold, down to one every slow_rate seconds in clean air. The SGP30
+    is still measured every tick, its baseline algorithm needs that.
+
+    Frames are published by reference and config['records'] of them are
+    reused round-robin, so a frame stays valid until that many newer ones
+    were taken. Every queue subscribed to 'frame' has to be bounded and
+    shorter, this raises ValueError otherwise.
+    """
+    i2c = config['i2c']
+    update_rate = config['update_rate']
+    period = asyncio.Periodic(int(update_rate * 1000), config.get('epoch'))
+    slow = max(1, int(config.get('slow_rate', update_rate) / update_rate + 0.5))
+    baseline_file = config.get('baseline_file', 'sgp30_baseline.bin')
+    save_ms = int(config.get('baseline_save_s', 3600) * 1000)
+    records = config.get('records', 17)
+    frames = Ring(Frame, records)
+
+    # only schedule the configured sensors that answer on the bus
+    present = await i2c.scan()
+    sensors = []
+    sht31 = sgp30 = None
+    for name in config.get('sensors', ('sps30', 'sht31', 'sgp30')):
+        cls, offset = SENSORS[name]
+        if cls.ADDRESS not in present:
+            print(name + ' not found')
+            continue
+        sensor = cls(i2c)
+        if name == 'sgp30':
+            ok = await sensor.init(baseline_file)
+            sgp30 = sensor
+        else:
+            ok = await sensor.init()
+        if name == 'sht31':
+            sht31 = sensor
+            if ok and config.get('sht31_mps'):
+                await sensor.start_periodic(config['sht31_mps'])
+        bus.publish(name + '_info', 'ok' if ok else 'error')
+        # keep reading after a failed init, the SPS30 e.g. isn't ready
+        # right after starting the measurement
+        sensors.append((name, sensor, offset))
+    if sgp30 is not None:
+        last_save = utime.ticks_ms()
+        next_save_ms = save_ms if sgp30.baseline_restored else BASELINE_LEARN_MS
+    proximity = bus.subscribe(['percent_smooth'], ConflatingQueue())
+    # the other tasks subscribed while the sensors were set up
+    backlog = bus.backlog('frame')
+    if backlog is None or backlog >= records:
+        raise ValueError('frame queues must hold fewer than {} records'.format(records))
+    every = 1
+    skip = 0
+
+    try:
+        while True:
+            for msg in proximity.get_many_nowait():
+                every = frame_every(msg[1], slow)
+                skip = min(skip, every - 1)
+            if skip:
+                skip -= 1
+                if sgp30 is not None:
+                    await sgp30.read_measured_values()
+                await period.wait()
+                continue
+            skip = every - 1
+
+            rec = frames.next()
+            rec.timestamp = time.time()
+            values = rec.values
+            for name, sensor, offset in sensors:
+                if sensor is sgp30 and sht31 is not None:
+                    await sgp30.set_humidity(sht31.absolute_humidity)
+                await sensor.read_measured_values()
+                if sensor.status[0] == 'error':
+                    print(sensor.status[1])
+                    bus.publish(name + '_info', 'error')
+                # on errors the drivers keep their previous values
+                src = sensor.data.values
+                for i in range(len(src)):
+                    values[offset + i] = src[i]
+            bus.publish('frame', rec)
+
+            if sgp30 is not None and utime.ticks_diff(utime.ticks_ms(), last_save) >= next_save_ms:
+                if await sgp30.get_baseline() is not None:
+                    sgp30.save_baseline(baseline_file)
+                last_save = utime.ticks_ms()
+                next_save_ms = save_ms
+            await period.wait()
+    except asyncio.CancelledError:
+        bus.unsubscribe(proximity)
+        return
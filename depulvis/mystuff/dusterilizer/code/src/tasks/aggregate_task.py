@@ -0,0 +1,103 @@
+from tasks.acquisition_task import Frame
+from stats import Aggregate
+from record import Ring
+from uasyncio.queues import Queue, QueueFull
+from array import array
+import uasyncio as asyncio
+import utime
+import time
+
+async def _tick(queue, ms):
+    # Wakes aggregate_task at the end of a window. A single sleep per
+    # window, a get_many() timeout would leave a waitq entry behind for
+    # every frame that arrives first.
+    await asyncio.sleep_ms(ms)
+    try:
+        queue.put_nowait(('tick', None))
+    except QueueFull:
+        # the frames waiting there wake it just as well
+        pass
+
+def _event(bus, events, rec):
+    ev = events.next()
+    ev.timestamp = rec.timestamp
+    values = ev.values
+    src = rec.values
+    for i in range(len(src)):
+        values[i] = src[i]
+    bus.publish('event', ev)
+
+async def aggregate_task(bus, config):
+    """Downsample the frames for mqtt_task.
+
+    Publishes ('summary', Aggregate) with min, mean, max and last of every
+    field once per window_s seconds, on a timer so summaries keep their
+    pace whatever the frame rate. A window without frames gives a summary
+    with n = 0, so a stall shows up at the other end. Events we alert on are passed through
+    right away as ('event', Frame): the frame that raised or cleared an
+    alarm, and a frame in which a field moved by more than
+    config['jumps'][field] since the previous one. Events are copies from
+    a ring of config['event_records'], every queue subscribed to 'event'
+    has to be bounded and shorter (ValueError otherwise).
+    """
+    window_ms = int(config.get('window_s', 60) * 1000)
+    fields = config.get('fields')
+    jumps = [(Frame.FIELDS.index(name), limit) for name, limit in config.get('jumps', {}).items()]
+    # two aggregates, one fills while mqtt_task may still serialize the other
+    aggs = [Aggregate(Frame, fields), Aggregate(Frame, fields)]
+    agg = aggs[0]
+    prev = array('f', [0.0] * len(Frame.FIELDS))
+    last = None
+    # an event may wait for mqtt_task longer than the acquisition keeps
+    # its frame, so it gets a record of its own
+    event_records = config.get('event_records', 17)
+    backlog = bus.backlog('event')
+    if backlog is None or backlog >= event_records:
+        raise ValueError('event queues must hold fewer than {} records'.format(event_records))
+    events = Ring(Frame, event_records)
+    # every frame counts, don't conflate
+    queue = bus.subscribe(['frame', 'alarm'], Queue(maxsize=config.get('queue', 16)))
+    window_end = utime.ticks_add(utime.ticks_ms(), window_ms)
+    tick = _tick(queue, window_ms)
+    asyncio.get_event_loop().create_task(tick)
+
+    try:
+        while True:
+            for msg in await queue.get_many(16):
+                if msg[0] == 'tick':
+                    continue
+                if msg[0] == 'alarm':
+                    # published by main_task right after the frame it judged
+                    if last is not None:
+                        _event(bus, events, last)
+                    continue
+                rec = msg[1]
+                values = rec.values
+                if last is not None:
+                    for i, limit in jumps:
+                        if abs(values[i] - prev[i]) > limit:
+                            _event(bus, events, rec)
+                            break
+                for i in range(len(values)):
+                    prev[i] = values[i]
+                last = rec
+                agg.update(rec)
+
+            now = utime.ticks_ms()
+            if utime.ticks_diff(now, window_end) >= 0:
+                if not agg.n:
+                    agg.start = agg.timestamp = time.time()
+                bus.publish('summary', agg)
+                agg = aggs[1] if agg is aggs[0] else aggs[0]
+                agg.reset()
+                window_end = utime.ticks_add(window_end, window_ms)
+                if utime.ticks_diff(window_end, now) <= 0:
+                    # the loop was held up for a whole window, don't
+                    # send empty summaries back to back
+                    window_end = utime.ticks_add(now, window_ms)
+                tick = _tick(queue, utime.ticks_diff(window_end, now))
+                asyncio.get_event_loop().create_task(tick)
+    except asyncio.CancelledError:
+        asyncio.cancel(tick)
+        bus.unsubscribe(queue)
+        return
@@ -9,11 +9,11 @@ async def logic_task(logic_queue, config):
         while True:
             msg = await logic_queue.get()
             data = msg[1]
-            if msg[0] == 'on':
+            if data == 'on':
                 pin.on()
-            elif msg[0] == 'off':
+            elif data == 'off':
                 pin.off()
             else:
-                print('unkown message in logic_task' + msg)
+                print('unkown message in logic_task' + str(msg))
     except asyncio.CancelledError:
         return
@@ -1,29 +1,112 @@
 import uasyncio as asyncio
-from umqtt.simple import MQTTClient
+from umqtt.aclient import MQTTClient
+from outbox import Outbox
+from telemetry import Batch, Encoder
+from tasks.acquisition_task import Frame
 import machine
 import ubinascii
 import struct
 import ujson
 import utime
 
+
+# bus topic: mqtt topic
+TOPICS = {
+    'summary': 'pm',
+    'event': 'pm/event',
+    'alarm': 'alarm',
+}
+
+
+def _put(outbox, batch, seqs, topic, payload, seq):
+    if batch is None:
+        # the outbox keeps the payload, copy it off the encoder's buffer
+        outbox.put(topic, bytes(payload) if isinstance(payload, memoryview) else payload)
+        return
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if not batch.add(payload):
+        if len(batch):
+            outbox.put(topic, batch.pack(), seqs[topic])
+        if not batch.add(payload):
+            # bigger than a whole batch
+            outbox.put(topic, bytes(payload), seq)
+            return
+    if len(batch) == 1:
+        # a batch is queued under the number of its first message
+        seqs[topic] = seq
+    if batch.full():
+        outbox.put(topic, batch.pack(), seqs[topic])
+
+
+async def _flush_batches(outbox, batches, seqs, max_age_ms):
+    # Put batches that are not full but old enough
+    while True:
+        await asyncio.sleep_ms(max_age_ms // 4)
+        for topic, batch in batches.items():
+            if batch.age_ms() >= max_age_ms:
+                outbox.put(topic, batch.pack(), seqs[topic])
+
+
 async def mqtt_task(mqtt_queue, config):
     broker = config['broker']
 
     client_id = b'esp32_' + ubinascii.hexlify(machine.unique_id())
-    client = MQTTClient(client_id, broker)
-    client.connect()
+    client = MQTTClient(client_id, broker, keepalive=config.get('keepalive', 60),
+                        inflight=config.get('inflight', 8))
+    # connects (and later reconnects) in the background
+    client.reconnect()
+    # messages wait here while the broker is unreachable and are sent oldest
+    # first in batches, every payload carries the outbox sequence number
+    outbox = Outbox(config.get('outbox'), config.get('outbox_ram', 32))
+    drain = outbox.drain(client, config.get('batch', 8), config.get('batch_interval_ms', 1000),
+                         qos=config.get('qos', 0))
+    asyncio.get_event_loop().create_task(drain)
+    # 'binary' packs into one reusable buffer, host/telemetry.py decodes it
+    encoder = Encoder(Frame.FIELDS) if config.get('format', 'json') == 'binary' else None
+    # opt-in: routine topics go out as batches of up to 'coalesce' messages,
+    # at the latest after 'coalesce_ms'
+    batches = {}
+    seqs = {}  # topic: sequence number of the batch
+    flush = None
+    if config.get('coalesce', 0) > 1:
+        batches['pm'] = Batch(config['coalesce'], compress=config.get('deflate', False))
+        flush = _flush_batches(outbox, batches, seqs, config.get('coalesce_ms', 600000))
+        asyncio.get_event_loop().create_task(flush)
 
     try:
         while True:
-            msg = await mqtt_queue.get()
-            data = msg[1]
-            if msg[0] == 'pm':
-                data['timestamp'] = utime.time()
-                print(ujson.dumps(data))
-                client.publish('pm', bytearray(ujson.dumps(data)))
-            elif msg[0] == 'hum/tmp':
-                client.publish('hum/tmp', bytearray(data))
-            else:
-                print('unkown message: ' + msg[0])
+            for msg in await mqtt_queue.get_many(16):
+                data = msg[1]
+                topic = TOPICS.get(msg[0])
+                if topic is None:
+                    print('unkown message: ' + msg[0])
+                    continue
+                batch = batches.get(topic)
+                # a batched message is put later with its batch, so take
+                # its own number now
+                seq = outbox.next_seq if batch is None else outbox.new_seq()
+                if msg[0] == 'summary' or msg[0] == 'event':
+                    if encoder is not None:
+                        payload = encoder.summary(seq, data) if msg[0] == 'summary' else encoder.frame(seq, data)
+                    else:
+                        # records carry their own timestamp and may be shared
+                        # with other subscribers, so serialize without
+                        # touching them
+                        d = data.as_dict()
+                        d['seq'] = seq
+                        payload = ujson.dumps(d)
+                elif msg[0] == 'alarm':
+                    if encoder is not None:
+                        payload = encoder.alarm(seq, data)
+                    else:
+                        payload = ujson.dumps({'seq': seq, 'alarm': data})
+                _put(outbox, batch, seqs, topic, payload, seq)
     except asyncio.CancelledError:
+        asyncio.cancel(drain)
+        if flush is not None:
+            asyncio.cancel(flush)
+            for topic, batch in batches.items():
+                if len(batch):
+                    outbox.put(topic, batch.pack(), seqs[topic])
         return